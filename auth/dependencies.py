@@ -0,0 +1,82 @@
+import hmac
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+
+from auth.jwt_handler import decode_access_token
+from db import MongoDB
+
+GUEST_USER_ID = "guest"
+# users.role value allowed on operational routes (/stats/*, /metrics)
+ADMIN_ROLE = os.getenv("ADMIN_ROLE", "admin")
+# Static bearer token for metrics scrapers, which cannot log in; unset disables it
+MONITORING_TOKEN = os.getenv("MONITORING_TOKEN")
+
+users_collection = MongoDB.get_db()["users"]
+
+# auto_error=False: routes decide whether a guest is allowed
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The caller of a request. Guests have user_id "guest"; `error` says why a
+    supplied token was not accepted, if one was.
+    """
+    user_id: str = GUEST_USER_ID
+    claims: dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def is_guest(self) -> bool:
+        return self.user_id == GUEST_USER_ID
+
+
+def principal_from_token(token: Optional[str]) -> Principal:
+    if not token:
+        return Principal()
+
+    payload = decode_access_token(token)
+    if "error" in payload:
+        return Principal(error=payload["error"])
+
+    user_id = payload.get("user_id")
+    if not user_id:
+        return Principal(claims=payload, error="User ID not found in token.")
+    return Principal(user_id=user_id, claims=payload)
+
+
+async def get_principal(token: Optional[str] = Depends(oauth2_scheme)) -> Principal:
+    """Principal for routes open to guests; a missing or invalid token yields a guest."""
+    return principal_from_token(token)
+
+
+async def require_user(principal: Principal = Depends(get_principal)) -> Principal:
+    """Principal for routes that need a logged-in user."""
+    if principal.is_guest:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=principal.error or "Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return principal
+
+
+async def require_admin(token: Optional[str] = Depends(oauth2_scheme)) -> Principal:
+    """Principal for operational routes: a user whose role is ADMIN_ROLE, or the monitoring token."""
+    if MONITORING_TOKEN and token and hmac.compare_digest(token, MONITORING_TOKEN):
+        return Principal(user_id="monitoring")
+
+    principal = await require_user(principal_from_token(token))
+    try:
+        user = await users_collection.find_one({"_id": ObjectId(principal.user_id)}, {"role": 1})
+    except Exception:
+        user = None
+    if not user or user.get("role") != ADMIN_ROLE:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return principal
@@ -1,12 +1,20 @@
 import jwt
+import time
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
+from cache import LRUCache
 
 load_dotenv()
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 
+# Verified tokens are remembered until their exp (at most this long) so repeat requests skip the HMAC check
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))
+JWT_CACHE_TTL_SECONDS = float(os.getenv("JWT_CACHE_TTL_SECONDS", "300"))
+
+verified_tokens = LRUCache(max_entries=JWT_CACHE_MAX_ENTRIES)
+
 # def create_access_token(data: dict) -> str:
 #     payload = data.copy()
 #     expiry = datetime.now() + timedelta(minutes=10)  # Token expires in 10 minutes
@@ -38,12 +46,22 @@ def create_access_token2(data: dict, access_end_date: datetime) -> str:
 #         return {"error": "Invalid token"}
 
 def decode_access_token(token: str):
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
-        print(payload)
-        return payload
     except jwt.ExpiredSignatureError:
         return {"error": "Token has expired"}
     except jwt.InvalidTokenError:
         return {"error": "Invalid token"}
 
+    # Only valid tokens are cached, and never past their expiry
+    ttl_seconds = JWT_CACHE_TTL_SECONDS
+    if "exp" in payload:
+        ttl_seconds = min(ttl_seconds, payload["exp"] - time.time())
+    if ttl_seconds > 0:
+        verified_tokens.set(token, payload, ttl_seconds=ttl_seconds)
+    return payload
+
@@ -1,8 +1,7 @@
 from datetime import datetime, time, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form, Request
 from bson import ObjectId
-from auth.jwt_handler import decode_access_token
-from fastapi.security import OAuth2PasswordBearer
+from auth.dependencies import Principal, require_user
 import pytz
 import boto3
 import os
@@ -11,14 +10,13 @@ from dotenv import load_dotenv
 import zipfile
 from db import MongoDB
 from auth.models import UserSchema, UserLoginSchema
-from auth.hashing import hash_password, verify_password
-from auth.jwt_handler import create_access_token, decode_access_token, create_access_token2
+from auth.hashing import password_hasher
+from auth.jwt_handler import create_access_token, create_access_token2
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import pymongo
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+from responses import MongoJSONResponse
 
 # Define IST timezone
 IST = pytz.timezone('Asia/Kolkata')
@@ -39,19 +37,6 @@ def is_valid_object_id(id_str: str) -> bool:
     except Exception:
         return False
 
-def serialize_mongo_document(document):
-
-    if isinstance(document, list):
-        return [serialize_mongo_document(doc) for doc in document]
-    
-    if isinstance(document, dict):
-        for key, value in document.items():
-            if isinstance(value, ObjectId):
-                document[key] = str(value)
-            elif isinstance(value, dict) or isinstance(value, list):
-                document[key] = serialize_mongo_document(value)
-    return document
-
 # def send_email(to_email: str, subject: str, body: str):
 #     smtp_server = os.getenv("MAIL_SERVER")
 #     smtp_port = os.getenv("MAIL_PORT")
@@ -89,7 +74,7 @@ async def register(user: UserSchema, request: Request):
             }
                    
         # Hash the password
-        user.password = hash_password(user.password)
+        user.password = await password_hasher.hash(user.password)
 
         generated_otp = ""
 
@@ -146,7 +131,8 @@ async def login(user: UserLoginSchema):
         }
 
     # Check if the password is correct
-    if not verify_password(user.password, existing_user["password"]):
+    password_valid, new_hash = await password_hasher.verify_and_update(user.password, existing_user["password"])
+    if not password_valid:
         return {
             "status": "error",
             "message": "The provided password is incorrect.",
@@ -164,6 +150,13 @@ async def login(user: UserLoginSchema):
             "code": status.HTTP_403_FORBIDDEN
         }
 
+    if new_hash:
+        # Hash uses an outdated scheme or cost: replace it unless it changed meanwhile
+        await users_collection.update_one(
+            {"_id": existing_user["_id"], "password": existing_user["password"]},
+            {"$set": {"password": new_hash}}
+        )
+
     # Create the JWT token
     token = create_access_token({
         "user_id": str(existing_user["_id"]),
@@ -181,29 +174,8 @@ async def login(user: UserLoginSchema):
     }
 
 @login_router.get("/user/profile")
-async def get_user_profile(token: str = Depends(oauth2_scheme)):
-    # Decode the access token to get user information
-    user = decode_access_token(token)
-    
-    if "error" in user:
-        return {
-            "status": "error",
-            "message": user["error"],
-            "data": None,
-            "error": "Unauthorized access.",
-            "code": status.HTTP_401_UNAUTHORIZED
-        }
-    
-    user_id = user.get("user_id")
-    
-    if not user_id:
-        return {
-            "status": "error",
-            "message": "User ID not found in token.",
-            "data": None,
-            "error": "Invalid token.",
-            "code": status.HTTP_400_BAD_REQUEST
-        }
+async def get_user_profile(principal: Principal = Depends(require_user)):
+    user_id = principal.user_id
 
     user_info = await users_collection.find_one({"_id": ObjectId(user_id)})
     
@@ -232,7 +204,7 @@ async def get_user_profile(token: str = Depends(oauth2_scheme)):
 
 
 #it will showcase all the pending users who requested for logging in
-@login_router.get("/admin/pending_users", dependencies=[Depends(oauth2_scheme)])
+@login_router.get("/admin/pending_users", dependencies=[Depends(require_user)])
 async def get_pending_rejected_users(
     page: int = Query(1, description="Page number to fetch"),
     pagesize: int = Query(10, description="Number of records per page"),
@@ -259,22 +231,20 @@ async def get_pending_rejected_users(
             "code": status.HTTP_200_OK
         }
     
-    # Serialize the MongoDB documents for proper JSON response
-    serialized_users = serialize_mongo_document(users)
-    
-    return {
+    # ObjectIds and datetimes are encoded by the response itself
+    return MongoJSONResponse({
         "status": "success",
         "message": "Pending and rejected researcher users fetched successfully.",
-        "data": serialized_users,
+        "data": users,
         "totalcount": total_count,
         "page": page,
         "pagesize": pagesize,
         "error": None,
         "code": status.HTTP_200_OK
-    }
+    })
 
 
 @login_router.get("/logout")
-async def logout(token: str = Depends(oauth2_scheme)):
+async def logout(principal: Principal = Depends(require_user)):
     return {"msg": "Logged out successfully"}
 
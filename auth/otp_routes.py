@@ -1,13 +1,11 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timedelta
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 from random import randint
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
-import os
 from db import MongoDB
+from mailer import mail_outbox
+from rate_limit import limit_otp, limit_otp_email
 
 otp_router = APIRouter()
 
@@ -19,9 +17,10 @@ otp_collection = db["otps"]
 class OTPRequest(BaseModel):
     email: str
 
-@otp_router.post("/send-otp")
+@otp_router.post("/send-otp", dependencies=[Depends(limit_otp)])
 async def send_otp(data: OTPRequest):
     email = data.email
+    await limit_otp_email(email)
 
     # Check if email is already registered
     existing_user = await users_collection.find_one({"email": email})
@@ -39,21 +38,9 @@ async def send_otp(data: OTPRequest):
         upsert=True
     )
 
-    # Send OTP via email
-    sender_email = os.getenv("MAIL_USERNAME")  
-    sender_password = os.getenv("MAIL_PASSWORD") 
-
+    # Queue the OTP email; the outbox worker sends it
     try:
-        message = MIMEMultipart()
-        message['From'] = sender_email
-        message['To'] = email
-        message['Subject'] = 'Your OTP Code'
-        message.attach(MIMEText(f'Your OTP code is: {generated_otp}', 'plain'))
-
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, email, message.as_string())
+        await mail_outbox.enqueue(email, 'Your OTP Code', f'Your OTP code is: {generated_otp}')
 
         return {
             "status": "success",
@@ -104,9 +91,10 @@ async def validate_otp(data: ValidateOTPRequest):
 class ForgotPasswordRequest(BaseModel):
     email: str
 
-@otp_router.post("/forgot-password/send-otp")
+@otp_router.post("/forgot-password/send-otp", dependencies=[Depends(limit_otp)])
 async def forgot_password_send_otp(data: ForgotPasswordRequest):
     email = data.email
+    await limit_otp_email(email)
 
     # Check if the email exists in the database
     user = await users_collection.find_one({"email": email,"status":"approved"})
@@ -124,20 +112,9 @@ async def forgot_password_send_otp(data: ForgotPasswordRequest):
         upsert=True
     )
 
-    # Send OTP via email
+    # Queue the OTP email; the outbox worker sends it
     try:
-        message = MIMEMultipart()
-        sender_email = os.getenv("MAIL_USERNAME")
-        sender_password = os.getenv("MAIL_PASSWORD")
-        message['From'] = sender_email
-        message['To'] = email
-        message['Subject'] = 'Password Reset OTP'
-        message.attach(MIMEText(f'Your OTP for password reset is: {generated_otp}', 'plain'))
-
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, email, message.as_string())
+        await mail_outbox.enqueue(email, 'Password Reset OTP', f'Your OTP for password reset is: {generated_otp}')
 
         return {"status": "success", "message": "OTP sent for password reset.", "code": status.HTTP_200_OK}
     except Exception as e:
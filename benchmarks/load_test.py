@@ -0,0 +1,375 @@
+"""
+End-to-end load test against local stand-ins for every upstream.
+
+Starts mock chatbot/ASR/NMT/TTS servers with configurable latency and
+payload sizes, seeds `Models` entries and a benchmark user pointing at them
+in a separate database of a local mongod, runs the app against that database
+with uvicorn and drives /login, /ask by text and by voice (with
+/message/{id} polling until TTS settles) and /chat/history at the given
+concurrency. Voice questions upload benchmarks/fixtures/question.wav (2 s,
+22.05 kHz), so ASR upload handling and audio normalization are exercised.
+Reports client-side throughput and p50/p99 per operation and the server's
+per-stage p50/p99 from /stats/latency.
+
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.load_test \\
+        --concurrency 50 --duration 60 --mix ask=5,voice=1,history=3,login=1 \\
+        --chatbot-latency 4:12 --tts-latency 2:8
+
+Latencies are MEDIAN:P99 seconds of a log-normal distribution. Seeding
+replaces the Models collection of --database (default BHU_Bot_load_test),
+which must not be the app's real database; only localhost URIs are accepted
+unless --allow-remote-mongo is given.
+"""
+import argparse
+import asyncio
+import hashlib
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from auth.hashing import hash_password
+from benchmarks.perf_log_report import percentile
+from db import MongoDB
+
+BENCHMARK_EMAIL = "load-test@example.com"
+BENCHMARK_PASSWORD = "load-test-password"
+# Lets the report read /stats/latency; pass the target's token when using --target-url
+MONITORING_TOKEN = os.getenv("MONITORING_TOKEN") or "load-test-monitoring"
+LANGUAGES = ("Hindi", "English")
+AUDIO_FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "question.wav")
+PRODUCTION_DATABASE = "BHU_Bot"
+
+
+class Latency:
+    """Log-normal latency with the given median and p99, in seconds."""
+
+    def __init__(self, median: float, p99: float):
+        self.median = median
+        self.p99 = max(p99, median)
+        self._sigma = math.log(self.p99 / median) / 2.326 if median > 0 else 0.0
+
+    @classmethod
+    def parse(cls, value: str) -> "Latency":
+        median, _, p99 = value.partition(":")
+        return cls(float(median), float(p99 or median))
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self._sigma)
+
+    async def wait(self):
+        await asyncio.sleep(self.sample())
+
+
+def filler_text(chars: int, seed: str) -> str:
+    words = ("Step", "Fill", "the", "form", "and", "attach", "documents", "to", "the", "application.")
+    rng = random.Random(seed)
+    text = []
+    length = 0
+    while length < chars:
+        word = rng.choice(words)
+        text.append(word)
+        length += len(word) + 1
+    return " ".join(text)[:chars]
+
+
+def build_mock_app(args) -> web.Application:
+    async def chatbot(request: web.Request):
+        payload = await request.json()
+        await args.chatbot_latency.wait()
+        answer = filler_text(args.response_chars, payload.get("message", ""))
+        return web.json_response({
+            "response": answer,
+            "summarized_response": answer[:args.summary_chars],
+            "session_id": request.match_info["session_id"],
+        })
+
+    async def asr(request: web.Request):
+        await request.read()
+        await args.asr_latency.wait()
+        return web.json_response({"data": {"recognized_text": "How do I apply for a bus pass?"}})
+
+    async def nmt(request: web.Request):
+        payload = await request.json()
+        await args.nmt_latency.wait()
+        return web.json_response({"data": {"output_text": payload.get("input_text", "")}})
+
+    async def tts(request: web.Request):
+        payload = await request.json()
+        await args.tts_latency.wait()
+        digest = hashlib.sha256(payload.get("text", "").encode("utf-8")).hexdigest()[:16]
+        return web.json_response({"data": {"s3_url": f"{args.mock_url}/audio/{digest}.wav"}})
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/chatbot/{session_id}", chatbot)
+    app.router.add_post("/asr", asr)
+    app.router.add_post("/nmt", nmt)
+    app.router.add_post("/tts", tts)
+    return app
+
+
+async def seed_database(args):
+    # The database is the benchmark's own, so no real model can shadow the mocks
+    db = MongoDB.get_db()
+    await db["Models"].delete_many({})
+    models = []
+    for language in LANGUAGES:
+        models.append({"model_type": "asr", "sourcelanguage": language, "api_url": f"{args.mock_url}/asr"})
+        models.append({"model_type": "tts", "sourcelanguage": language, "api_url": f"{args.mock_url}/tts"})
+        if language != "English":
+            models.append({"model_type": "nmt", "sourcelanguage": language, "targetlanguage": "English", "api_url": f"{args.mock_url}/nmt"})
+            models.append({"model_type": "nmt", "sourcelanguage": "English", "targetlanguage": language, "api_url": f"{args.mock_url}/nmt"})
+    for model in models:
+        model["access-token"] = "benchmark"
+    await db["Models"].insert_many(models)
+
+    await db["users"].update_one(
+        {"email": BENCHMARK_EMAIL},
+        {"$set": {
+            "email": BENCHMARK_EMAIL,
+            "firstname": "Load",
+            "lastname": "Test",
+            "name": "Load Test",
+            "password": hash_password(BENCHMARK_PASSWORD),
+            "role": "developer",
+            "status": "approved",
+        }},
+        upsert=True
+    )
+
+
+def start_app(args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "CHATBOT_API_URL": f"{args.mock_url}/chatbot",
+        "JWT_SECRET_KEY": env.get("JWT_SECRET_KEY") or "load-test-secret",
+        "MAIL_TRANSPORT": "debug",
+        "MONITORING_TOKEN": MONITORING_TOKEN,
+        "PERFORMANCE_LOG_ENABLED": "false",
+        # Limits would cap the measured throughput
+        "RATE_LIMIT_ASK_PER_MINUTE": "0",
+        "RATE_LIMIT_GUEST_ASK_PER_MINUTE": "0",
+        "RATE_LIMIT_VOTE_PER_MINUTE": "0",
+    })
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(args.app_port),
+        "--workers", str(args.app_workers), "--log-level", "warning",
+    ]
+    return subprocess.Popen(command, env=env)
+
+
+async def wait_until_up(session: aiohttp.ClientSession, url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{url}/") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"App did not start at {url}")
+
+
+class LoadDriver:
+    def __init__(self, args, session: aiohttp.ClientSession):
+        self.args = args
+        self.session = session
+        self.url = args.target_url
+        self.token: Optional[str] = None
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._question_counter = 0
+        with open(AUDIO_FIXTURE, "rb") as fixture:
+            self._audio = fixture.read()
+        operations, weights = zip(*args.mix)
+        self._operations = operations
+        self._weights = weights
+
+    def record(self, operation: str, started: float, ok: bool):
+        if ok:
+            self.latencies[operation].append(time.monotonic() - started)
+        else:
+            self.errors[operation] += 1
+
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    async def login(self) -> bool:
+        started = time.monotonic()
+        async with self.session.post(f"{self.url}/login", json={"email": BENCHMARK_EMAIL, "password": BENCHMARK_PASSWORD}) as response:
+            body = await response.json()
+        ok = response.status == 200 and body.get("status") == "success"
+        if ok:
+            self.token = body["data"]["access_token"]
+        self.record("login", started, ok)
+        return ok
+
+    async def history(self):
+        started = time.monotonic()
+        async with self.session.get(f"{self.url}/chat/history", params={"limit": "20"}, headers=self.headers()) as response:
+            await response.read()
+        self.record("history", started, response.status == 200)
+
+    async def ask(self):
+        self._question_counter += 1
+        question = f"How do I apply for a bus pass? #{self._question_counter % self.args.question_pool}"
+        await self.post_question("ask", {"question": question, "language": random.choice(self.args.languages)})
+
+    async def voice(self):
+        form = aiohttp.FormData()
+        form.add_field("language", random.choice(self.args.languages))
+        form.add_field("audio_file", self._audio, filename="question.wav", content_type="audio/wav")
+        await self.post_question("voice", form)
+
+    async def post_question(self, operation: str, form):
+        started = time.monotonic()
+        async with self.session.post(f"{self.url}/ask/null", data=form, headers=self.headers()) as response:
+            body = await response.json()
+        ok = response.status == 200 and body.get("status") == "success"
+        self.record(operation, started, ok)
+        if not ok:
+            return
+
+        # Poll like the web client until both audios settle
+        deadline = time.monotonic() + self.args.poll_timeout
+        while time.monotonic() < deadline:
+            poll_started = time.monotonic()
+            async with self.session.get(f"{self.url}/message/{body['message_id']}", headers=self.headers()) as response:
+                state = (await response.json()).get("data", {})
+            self.record("message_poll", poll_started, response.status == 200)
+            if "processing" not in (state.get("tts_status"), state.get("tts_summary_status")):
+                self.record(f"{operation}_until_tts", started, True)
+                return
+            await asyncio.sleep(self.args.poll_interval)
+        self.record(f"{operation}_until_tts", started, False)
+
+    async def run_worker(self, deadline: float):
+        while time.monotonic() < deadline:
+            operation = random.choices(self._operations, self._weights)[0]
+            try:
+                await getattr(self, operation)()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                self.errors[operation] += 1
+
+
+def print_client_report(driver: LoadDriver, elapsed: float):
+    print(f"\nClient-side ({elapsed:.1f}s)")
+    print(f"{'operation':16} {'count':>7} {'errors':>7} {'req/s':>8} {'p50':>8} {'p99':>8}")
+    for operation in sorted(set(driver.latencies) | set(driver.errors)):
+        values = sorted(driver.latencies[operation])
+        p50 = percentile(values, 0.5) if values else float("nan")
+        p99 = percentile(values, 0.99) if values else float("nan")
+        print(
+            f"{operation:16} {len(values):7d} {driver.errors[operation]:7d} "
+            f"{len(values) / elapsed:8.2f} {p50:8.3f} {p99:8.3f}"
+        )
+
+
+async def print_server_report(session: aiohttp.ClientSession, url: str):
+    headers = {"Authorization": f"Bearer {MONITORING_TOKEN}"}
+    async with session.get(f"{url}/stats/latency", headers=headers) as response:
+        if response.status != 200:
+            print("\nServer stage latencies unavailable")
+            return
+        rows = (await response.json())["data"]
+    # With several app workers this reflects the worker that answered
+    print("\nServer-side stages (/stats/latency)")
+    print(f"{'stage':16} {'language':10} {'count':>7} {'p50':>8} {'p99':>8}")
+    for row in rows:
+        print(f"{row['stage']:16} {row['language']:10} {row['count']:7d} {row['p50'] or 0:8.3f} {row['p99'] or 0:8.3f}")
+
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in value.split(","):
+        operation, _, weight = part.partition("=")
+        if operation not in ("ask", "voice", "history", "login"):
+            raise argparse.ArgumentTypeError(f"unknown operation {operation!r}")
+        mix.append((operation, float(weight or 1)))
+    return mix
+
+
+async def run(args):
+    mongo_host = urlparse(os.getenv("MONGO_URI", "")).hostname
+    if mongo_host not in ("localhost", "127.0.0.1") and not args.allow_remote_mongo:
+        raise SystemExit("MONGO_URI must point at a local mongod (or pass --allow-remote-mongo)")
+
+    mock_runner = web.AppRunner(build_mock_app(args))
+    await mock_runner.setup()
+    await web.TCPSite(mock_runner, "127.0.0.1", args.mock_port).start()
+
+    app_process = None
+    if args.target_url is None:
+        if args.database == PRODUCTION_DATABASE:
+            raise SystemExit(f"--database must not be {PRODUCTION_DATABASE}; seeding replaces its models")
+        # Read by MongoDB.get_db here and inherited by the app process
+        os.environ["MONGO_DB_NAME"] = args.database
+        args.target_url = f"http://127.0.0.1:{args.app_port}"
+        await seed_database(args)
+        app_process = start_app(args)
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency * 2)
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await wait_until_up(session, args.target_url)
+            driver = LoadDriver(args, session)
+            if not await driver.login():
+                raise SystemExit("Benchmark user could not log in")
+
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(*(driver.run_worker(deadline) for _ in range(args.concurrency)))
+            print_client_report(driver, time.monotonic() - started)
+            await print_server_report(session, args.target_url)
+    finally:
+        if app_process is not None:
+            app_process.terminate()
+            app_process.wait(timeout=30)
+        await mock_runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app against local upstream stand-ins.")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent simulated clients")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to drive load")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("ask=5,voice=1,history=3,login=1"), help="Weighted operations")
+    parser.add_argument("--languages", type=lambda value: value.split(","), default=["English", "Hindi"])
+    parser.add_argument("--question-pool", type=int, default=1_000_000, help="Distinct questions; small pools hit the answer cache")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between /message polls")
+    parser.add_argument("--poll-timeout", type=float, default=120.0, help="Give up waiting for TTS after this long")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--chatbot-latency", type=Latency.parse, default=Latency(4, 12))
+    parser.add_argument("--asr-latency", type=Latency.parse, default=Latency(2, 6))
+    parser.add_argument("--nmt-latency", type=Latency.parse, default=Latency(0.4, 2))
+    parser.add_argument("--tts-latency", type=Latency.parse, default=Latency(3, 15))
+    parser.add_argument("--response-chars", type=int, default=1500, help="Chatbot answer size")
+    parser.add_argument("--summary-chars", type=int, default=300, help="Chatbot summary size")
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--app-port", type=int, default=9000)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--target-url", help="Drive an already running app instead of starting one (no seeding)")
+    parser.add_argument("--database", default="BHU_Bot_load_test", help="Database to seed and run the app against")
+    parser.add_argument("--allow-remote-mongo", action="store_true")
+    args = parser.parse_args()
+    args.mock_url = f"http://127.0.0.1:{args.mock_port}"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
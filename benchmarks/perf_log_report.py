@@ -0,0 +1,197 @@
+"""
+Percentile and regression reports for performance_logs.txt.
+
+Each `=== Request at ... ===` block holds cumulative checkpoints; a stage's
+duration is the time from the previous checkpoint to the one it is named
+after. Files are streamed, so rotated backups can be passed as well:
+
+    python -m benchmarks.perf_log_report performance_logs.txt*
+    python -m benchmarks.perf_log_report performance_logs.txt --by all --stage chatbot_response_received
+    python -m benchmarks.perf_log_report performance_logs.txt \\
+        --baseline 2025-04-01:2025-04-15 --candidate 2025-04-16:2025-04-30
+
+With --baseline and --candidate the exit status is 1 if any stage regressed.
+"""
+import argparse
+import re
+import sys
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+BLOCK_HEADER = re.compile(r"^=== Request at (\S+) ===$")
+CHECKPOINT = re.compile(r"^(.+?): (\d+(?:\.\d+)?)s$")
+TOTAL_LABELS = ("Pre-TTS total time", "Total time")
+
+
+def parse_blocks(lines: Iterable[str]) -> Iterator[Tuple[datetime, Dict[str, float]]]:
+    """Yields (request time, {checkpoint: cumulative seconds}) per block."""
+    started_at = None
+    checkpoints: Dict[str, float] = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        header = BLOCK_HEADER.match(line)
+        if header:
+            if started_at is not None:
+                yield started_at, checkpoints
+            try:
+                started_at = datetime.fromisoformat(header.group(1))
+            except ValueError:
+                started_at = None
+            checkpoints = {}
+            continue
+        checkpoint = CHECKPOINT.match(line)
+        if checkpoint and started_at is not None:
+            checkpoints[checkpoint.group(1)] = float(checkpoint.group(2))
+    if started_at is not None:
+        yield started_at, checkpoints
+
+
+def stage_durations(checkpoints: Dict[str, float], already_counted: Dict[str, float]) -> List[Tuple[str, float]]:
+    """
+    Deltas between consecutive checkpoints, named after the later one, plus
+    the block's total. Checkpoints repeated from the request's earlier
+    pre-TTS block (`already_counted`) are skipped so they count once.
+    """
+    durations = []
+    previous = 0.0
+    for name, elapsed in sorted(checkpoints.items(), key=lambda item: item[1]):
+        if name in TOTAL_LABELS:
+            durations.append((name, elapsed))
+            continue
+        if already_counted.get(name) != elapsed:
+            durations.append((name, elapsed - previous))
+        previous = elapsed
+    return durations
+
+
+def is_continuation(checkpoints: Dict[str, float], previous: Dict[str, float]) -> bool:
+    # The post-TTS block repeats every pre-TTS checkpoint of the same request
+    steps = {name: value for name, value in previous.items() if name not in TOTAL_LABELS}
+    return bool(steps) and all(checkpoints.get(name) == value for name, value in steps.items())
+
+
+def collect(paths: List[str], stage_filter: Optional[str] = None) -> Dict[date, Dict[str, List[float]]]:
+    """Returns {day: {stage: [seconds]}} over every block in `paths`."""
+    samples: Dict[date, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    for path in paths:
+        previous: Dict[str, float] = {}
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for started_at, checkpoints in parse_blocks(f):
+                already_counted = previous if is_continuation(checkpoints, previous) else {}
+                for stage, seconds in stage_durations(checkpoints, already_counted):
+                    if stage_filter is None or stage == stage_filter:
+                        samples[started_at.date()][stage].append(seconds)
+                previous = checkpoints
+    return samples
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear interpolation between closest ranks."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = q * (len(sorted_values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def distribution(values: List[float]) -> dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1],
+    }
+
+
+def merge(samples: Dict[date, Dict[str, List[float]]], start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, List[float]]:
+    merged: Dict[str, List[float]] = defaultdict(list)
+    for day, stages in samples.items():
+        if (start and day < start) or (end and day > end):
+            continue
+        for stage, values in stages.items():
+            merged[stage].extend(values)
+    return merged
+
+
+def print_table(title: str, stages: Dict[str, List[float]]):
+    print(f"\n{title}")
+    print(f"{'stage':40} {'count':>7} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for stage in sorted(stages):
+        row = distribution(stages[stage])
+        print(
+            f"{stage:40} {row['count']:7d} {row['mean']:8.3f} {row['p50']:8.3f} "
+            f"{row['p95']:8.3f} {row['p99']:8.3f} {row['max']:8.3f}"
+        )
+
+
+def parse_window(value: str) -> Tuple[date, date]:
+    start, _, end = value.partition(":")
+    try:
+        return date.fromisoformat(start), date.fromisoformat(end or start)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD:YYYY-MM-DD, got {value!r}")
+
+
+def compare(baseline: Dict[str, List[float]], candidate: Dict[str, List[float]], threshold: float, min_count: int) -> int:
+    """Prints p50/p95 changes per stage and returns the number of regressions."""
+    print(f"\n{'stage':40} {'base p50':>9} {'cand p50':>9} {'base p95':>9} {'cand p95':>9} {'change':>8}")
+    regressions = 0
+    for stage in sorted(set(baseline) & set(candidate)):
+        before, after = distribution(baseline[stage]), distribution(candidate[stage])
+        change = (after["p95"] - before["p95"]) / before["p95"] if before["p95"] else 0.0
+        flag = ""
+        if min(before["count"], after["count"]) < min_count:
+            flag = "  (too few samples)"
+        elif change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(
+            f"{stage:40} {before['p50']:9.3f} {after['p50']:9.3f} "
+            f"{before['p95']:9.3f} {after['p95']:9.3f} {change:+8.1%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Percentile and regression reports for performance_logs.txt.")
+    parser.add_argument("paths", nargs="+", help="Log files, e.g. performance_logs.txt and its rotated backups")
+    parser.add_argument("--by", choices=("day", "all"), default="day", help="One table per day, or one overall")
+    parser.add_argument("--stage", help="Only report this checkpoint")
+    parser.add_argument("--baseline", type=parse_window, help="Baseline window, YYYY-MM-DD:YYYY-MM-DD")
+    parser.add_argument("--candidate", type=parse_window, help="Candidate window, YYYY-MM-DD:YYYY-MM-DD")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Flag a p95 increase above this fraction")
+    parser.add_argument("--min-count", type=int, default=20, help="Samples needed in both windows to flag a stage")
+    args = parser.parse_args()
+
+    samples = collect(args.paths, args.stage)
+    if not samples:
+        print("No request blocks found")
+        return
+
+    if args.baseline or args.candidate:
+        if not (args.baseline and args.candidate):
+            parser.error("--baseline and --candidate must be given together")
+        baseline = merge(samples, *args.baseline)
+        candidate = merge(samples, *args.candidate)
+        print_table(f"Baseline {args.baseline[0]} to {args.baseline[1]}", baseline)
+        print_table(f"Candidate {args.candidate[0]} to {args.candidate[1]}", candidate)
+        regressions = compare(baseline, candidate, args.threshold, args.min_count)
+        print(f"\n{regressions} stage(s) regressed by more than {args.threshold:.0%} at p95")
+        sys.exit(1 if regressions else 0)
+
+    if args.by == "all":
+        print_table("All requests", merge(samples))
+    else:
+        for day in sorted(samples):
+            print_table(str(day), samples[day])
+
+
+if __name__ == "__main__":
+    main()
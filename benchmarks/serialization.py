@@ -0,0 +1,91 @@
+"""
+Compares the previous history response path (recursive ObjectId conversion,
+then jsonable_encoder and JSONResponse) with MongoJSONResponse on a
+synthetic conversation:
+
+    python -m benchmarks.serialization --messages 500
+"""
+import argparse
+import timeit
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from responses import MongoJSONResponse
+
+
+def make_conversation(message_count: int) -> dict:
+    conversation_id = ObjectId()
+    user_id = ObjectId()
+    started = datetime.utcnow()
+    messages = []
+    for i in range(message_count):
+        messages.append({
+            "_id": ObjectId(),
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "question": f"How do I apply for the scheme? ({i})",
+            "response": "Step 1: Fill the form.\nStep 2: Attach the documents.\n" * 8,
+            "summarized_response": "Fill the form and attach the documents.",
+            "timestamp": started + timedelta(seconds=i),
+            "tts_status": "completed",
+            "tts_url": f"https://example.com/tts/{i}.mp3",
+            "tts_summary_status": "completed",
+            "tts_summary_url": f"https://example.com/tts/{i}-summary.mp3",
+            "like_count": i % 3,
+            "dislike_count": 0,
+            "feedback": None,
+            "vote": None,
+        })
+    return {
+        "_id": conversation_id,
+        "user_id": user_id,
+        "title": messages[0]["question"] if messages else "Untitled",
+        "language": "Hindi",
+        "created_at": started,
+        "updated_at": started,
+        "messages": messages,
+    }
+
+
+def convert_objectid_fields(doc):
+    if isinstance(doc, dict):
+        return {k: str(v) if isinstance(v, ObjectId) else convert_objectid_fields(v) for k, v in doc.items()}
+    elif isinstance(doc, list):
+        return [convert_objectid_fields(i) for i in doc]
+    else:
+        return doc
+
+
+def legacy_response(conversation: dict) -> bytes:
+    content = {"status": "success", "message": "Chat history retrieved successfully.", "data": convert_objectid_fields(conversation)}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def mongo_json_response(conversation: dict) -> bytes:
+    content = {"status": "success", "message": "Chat history retrieved successfully.", "data": conversation}
+    return MongoJSONResponse(content).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history response serialization.")
+    parser.add_argument("--messages", type=int, default=500, help="Messages in the conversation")
+    parser.add_argument("--repeat", type=int, default=50, help="Responses rendered per measurement")
+    args = parser.parse_args()
+
+    conversation = make_conversation(args.messages)
+    body_size = len(mongo_json_response(conversation))
+
+    results = {}
+    for name, render in (("legacy", legacy_response), ("MongoJSONResponse", mongo_json_response)):
+        best = min(timeit.repeat(lambda: render(conversation), number=args.repeat, repeat=5))
+        results[name] = best / args.repeat * 1000
+        print(f"{name:18} {results[name]:8.3f} ms/response")
+
+    print(f"{args.messages} messages, {body_size} bytes, speedup {results['legacy'] / results['MongoJSONResponse']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
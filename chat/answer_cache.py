@@ -0,0 +1,70 @@
+import asyncio
+import os
+import re
+from typing import Awaitable, Callable, Optional, Tuple
+
+from cache import LRUCache, SingleFlight
+
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "600"))
+
+# (raw_response_text, summarized_response)
+Answer = Tuple[str, str]
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question).strip().lower()
+    return question.rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    Caches chatbot answers for stateless (new-session) questions, keyed by the
+    normalized English question, and coalesces concurrent identical questions
+    into a single upstream call. Requests that carry a chatbot session are
+    never cached since their answers depend on the conversation so far.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._answers = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._in_flight = SingleFlight()
+
+    @staticmethod
+    def is_cacheable(session_id: str) -> bool:
+        return session_id == "null"
+
+    def get(self, question: str) -> Optional[Answer]:
+        return self._answers.get(normalize_question(question))
+
+    def set(self, question: str, answer: Answer):
+        self._answers.set(normalize_question(question), answer)
+
+    async def get_or_fetch(self, question: str, fetch: Callable[[], Awaitable[Answer]]) -> Answer:
+        key = normalize_question(question)
+        answer = self._answers.get(key)
+        if answer is not None:
+            return answer
+
+        async def fetch_and_store():
+            fetched = await fetch()
+            self._answers.set(key, fetched)
+            return fetched
+
+        return await self._in_flight.do(key, fetch_and_store)
+
+    def join(self, question: str) -> Optional[Awaitable[Answer]]:
+        """The answer already being fetched for this question, if any."""
+        return self._in_flight.join(normalize_question(question))
+
+    def lead(self, question: str) -> asyncio.Future:
+        """Publishes an answer the caller fetches itself, so identical questions wait for it."""
+        return self._in_flight.lead(normalize_question(question))
+
+    def get_stats(self) -> dict:
+        return {
+            "answers": self._answers.get_stats(),
+            "single_flight": self._in_flight.get_stats(),
+        }
+
+
+answer_cache = AnswerCache(max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS)
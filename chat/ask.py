@@ -1,24 +1,46 @@
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Path, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Path
 from bson import ObjectId
-from auth.jwt_handler import decode_access_token
-from fastapi.security import OAuth2PasswordBearer
+from auth.dependencies import Principal, get_principal, require_user
+from fastapi.responses import StreamingResponse
 import aiohttp
 from db import MongoDB
+from http_client import HTTPClient
+from chat.forms import form_link_index
+from chat.model_registry import model_registry
+from chat.translation_cache import translation_cache
+from chat.tts_cache import tts_cache
+from chat.answer_cache import answer_cache
+from cache import CallAbandoned
+from chat.tts_queue import TTSJobQueue, settled_tts_fields
+from chat.message_store import message_store
+from chat.audio_upload import iter_upload_chunks, validate_audio_upload
+from chat.audio_preprocess import ASR_DEFAULT_SAMPLE_RATE, audio_preprocessor
+from chat.vote import get_user_vote
+from responses import MongoJSONResponse
+from rate_limit import limit_ask
+from metrics import RequestTimer, observe_stage, start_request_timer
+from resilience import (
+    ASR_TIMEOUT_SECONDS, CHATBOT_TIMEOUT_SECONDS, NMT_TIMEOUT_SECONDS, TTS_TIMEOUT_SECONDS,
+    Upstream, call_budget, call_upstream, guarded, model_upstreams, start_deadline
+)
+from chat.notifications import (
+    NOTIFICATIONS_CHANGE_STREAM, ChangeStreamRelay, conversation_topic, message_topic, pubsub
+)
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+import asyncio
+import json
 import re
 import time
 import os
 
 
 CHATBOT_API_URL = os.getenv("CHATBOT_API_URL")
+CHATBOT_UPSTREAM = Upstream("chatbot#0", CHATBOT_API_URL)
 
-# Initialize router
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)  # Note auto_error=False
-
-async def get_optional_token(token: Optional[str] = Depends(oauth2_scheme)):
-    return token
+# How long the streaming endpoint waits for TTS before reporting the current state
+TTS_STREAM_WAIT_SECONDS = float(os.getenv("TTS_STREAM_WAIT_SECONDS", "60"))
 
 ask_router = APIRouter()
 
@@ -37,42 +59,21 @@ async def format_response_as_bullets(response_text: str, language: str) -> str:
     ONLY replaces form names with links (e.g. "Form 1A" → "https://.../form1a.pdf")
     Returns the original text with just form links replaced
     """
-    # Query all form names and their links from the database
-    forms_data = await forms_collection.find().to_list(length=None)
-    
-    # Build a mapping of form identifiers to their links
-    forms_dict = {}
-    for form in forms_data:
-        match = re.search(r"form[-\s]*(\d*[a-zA-Z]?\d*)", form["form_name"], re.IGNORECASE)
-        if match and match.group(1):
-            form_identifier = match.group(1).lower()
-            forms_dict[form_identifier] = form["aws_link"]
-    
-    # Normalize "Form No" variations into standard format
-    response_text = re.sub(
-        r"form(?:[-\s]+(?:no\.?|number))?[-\s]*\n?\s*(\d*[a-zA-Z]?\d*)", 
-        r"Form \1", 
-        response_text, 
-        flags=re.IGNORECASE
-    )
-    
-    # Replace form identifiers with direct links
-    for form_identifier, form_link in forms_dict.items():
-        pattern = rf"(?<!\w)(?:Form(?:[-\s]+(?:No\.?|Number))?[-\s]*){re.escape(form_identifier)}(?!\w)"
-        response_text = re.sub(
-            pattern, 
-            lambda match: f"{form_link}",  # Direct link replacement
-            response_text, 
-            flags=re.IGNORECASE
-        )
-    
-    return response_text  # Return original text with ONLY form links replaced
+    # Forms are served from the cached index instead of querying Mongo per call
+    return await form_link_index.rewrite(response_text)
+
 
+async def get_translation(input_text: str, access_token: str, upstreams: List[Upstream]):
+    # Replicas serve the same model, so the cache is keyed by the primary URL
+    cached_output = await translation_cache.get(upstreams[0].url, input_text)
+    if cached_output is not None:
+        return cached_output
 
-async def get_translation(input_text: str, access_token: str, api_url: str):
     headers = {"access-token": f"{access_token}"}
     data = {"input_text": input_text}
-    async with aiohttp.ClientSession() as session:
+    session = HTTPClient.get_session()
+
+    async def request(api_url: str) -> str:
         async with session.post(api_url, json=data, headers=headers) as response:
             if response.status == 200:
                 result = await response.json()
@@ -81,12 +82,31 @@ async def get_translation(input_text: str, access_token: str, api_url: str):
             else:
                 raise HTTPException(status_code=500, detail="Translation API error")
 
+    output_text = await call_upstream(upstreams, request, NMT_TIMEOUT_SECONDS, hedge=True)
+    await translation_cache.set(upstreams[0].url, input_text, output_text)
+    return output_text
+
 def clean_text_for_tts(text):
     # Remove bullet points and unnecessary symbols
     cleaned_text = re.sub(r"•\s*", "", text)
     return cleaned_text.strip()
 
-async def get_tts(text: str, access_token: str, api_url: str, gender: str = "male"):
+async def gather_or_cancel(*coros):
+    """
+    Runs independent calls concurrently and returns their results in order.
+    If one fails, the others are cancelled and awaited before the error is
+    raised, so they do not keep holding upstream connections.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def get_tts(text: str, access_token: str, upstreams: List[Upstream], gender: str = "male"):
     headers = {"access-token": access_token}
     data = {"text": text, "gender": gender}  # Defaulting to male
 
@@ -95,7 +115,9 @@ async def get_tts(text: str, access_token: str, api_url: str, gender: str = "mal
     # print("Access-token: ", access_token)
 
 
-    async with aiohttp.ClientSession() as session:
+    session = HTTPClient.get_session()
+
+    async def request(api_url: str) -> str:
         async with session.post(api_url, json=data, headers=headers) as response:
             response_text = await response.text()
             
@@ -107,15 +129,24 @@ async def get_tts(text: str, access_token: str, api_url: str, gender: str = "mal
                     status_code=response.status,
                     detail=f"TTS API error: {response.status} - {response_text}"
                 )
+
+    # Not hedged: every synthesis is billed and stored upstream
+    return await call_upstream(upstreams, request, TTS_TIMEOUT_SECONDS)
             
 
-async def get_asr(audio_file: UploadFile, access_token: str, api_url: str):
+async def get_asr(audio_file: UploadFile, access_token: str, upstreams: List[Upstream], normalized_audio: Optional[bytes] = None):
     headers = {"access-token": f"{access_token}"}  # No need to set Content-Type, aiohttp does it automatically
-    
-    form_data = aiohttp.FormData()  
-    form_data.add_field("audio_file", await audio_file.read(), filename=audio_file.filename, content_type="audio/wav")
+    session = HTTPClient.get_session()
+
+    async def request(api_url: str) -> str:
+        # A form is consumed by one request, so each attempt builds its own
+        form_data = aiohttp.FormData()  
+        if normalized_audio is not None:
+            form_data.add_field("audio_file", normalized_audio, filename="audio.wav", content_type="audio/wav")
+        else:
+            # The spooled upload is streamed in chunks (chunked transfer) instead of being copied into one bytes object
+            form_data.add_field("audio_file", iter_upload_chunks(audio_file), filename=audio_file.filename, content_type="audio/wav")
 
-    async with aiohttp.ClientSession() as session:
         async with session.post(api_url, headers=headers, data=form_data) as response:
             if response.status == 200:
                 result = await response.json()
@@ -124,6 +155,9 @@ async def get_asr(audio_file: UploadFile, access_token: str, api_url: str):
                 error_text = await response.text()  # Get detailed error message
                 raise HTTPException(status_code=500, detail=f"ASR API error: {error_text}")
 
+    # Concurrent attempts cannot share the upload's file position, so only in-memory audio is hedged
+    return await call_upstream(upstreams, request, ASR_TIMEOUT_SECONDS, hedge=normalized_audio is not None)
+
 
 async def get_or_create_conversation(user_id: str, language: str):
     user_id_obj = ObjectId(user_id) if user_id != "guest" else "guest"
@@ -135,7 +169,6 @@ async def get_or_create_conversation(user_id: str, language: str):
         "user_id": user_id_obj,
         "conversation_id": new_conversation_id,
         "language": language,
-        "messages": [],
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
@@ -143,47 +176,13 @@ async def get_or_create_conversation(user_id: str, language: str):
     
     return new_conversation_id
 
-@ask_router.post("/ask/{conversation_id}")
-async def store_chat_message(
-    background_tasks: BackgroundTasks,
-    conversation_id: str = Path(...),
-    token: Optional[str] = Depends(get_optional_token),
-    question: Optional[str] = Form(None),
-    language: str = Form("English"),
-    audio_file: Optional[UploadFile] = File(None)
-):
-    # Initialize timestamps dictionary
-    timestamps = {
-        "start_time": time.time(),
-        "steps": {}
-    }
-    
-    def log_timestamp(step_name):
-        timestamps["steps"][step_name] = {
-            "timestamp": time.time(),
-            "elapsed": time.time() - timestamps["start_time"]
-        }
-    
-    # Start logging
-    log_timestamp("request_received")
-    
-    # Handle authentication - token is now optional
-    user_id = "guest"  # Default to guest user
-    if token:
-        user = decode_access_token(token)
-        if "error" not in user:
-            user_id = user.get("user_id", "guest")
-    
-    if not question and not audio_file:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Either text or audio input is required")
-
+async def resolve_conversation(conversation_id: str, user_id: str, language: str, timer: RequestTimer):
+    """Returns (conversation_id, session_id), creating a conversation for "null"."""
     session_id = "null"  # Default session_id
-    
-    log_timestamp("authentication_complete")
-    
+
     if conversation_id.lower() == "null":
         conversation_id = await get_or_create_conversation(user_id, language)
-        log_timestamp("conversation_created")
+        timer.log_timestamp("conversation_created")
     else:
         try:
             conversation_obj_id = ObjectId(conversation_id)
@@ -196,68 +195,221 @@ async def store_chat_message(
                 raise HTTPException(status_code=403, detail="Not authorized to access this conversation")
                 
             session_id = existing_conversation.get("session_id", "null")
-            log_timestamp("existing_conversation_retrieved")
+            timer.log_timestamp("existing_conversation_retrieved")
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid conversation ID format")
 
+    return conversation_id, session_id
+
+
+async def recognize_question(question: Optional[str], audio_file: Optional[UploadFile], language: str, timer: RequestTimer):
     # Process ASR if audio file is provided
     if audio_file:
-        asr_start = time.time()
-        asr_model = await models_collection.find_one({"sourcelanguage": language, "model_type": "asr"})
+        asr_model = await model_registry.get(model_type="asr", source=language)
         if not asr_model:
             raise HTTPException(status_code=500, detail="ASR model not found")
-        question = await get_asr(audio_file, asr_model["access-token"], asr_model["api_url"])
-        log_timestamp("asr_completed")
-    
-    original_question = question
-    log_timestamp("question_processed")
+        # Mono, model sample rate, silence trimmed; None means the upload is sent as is
+        normalized_audio = await audio_preprocessor.normalize(audio_file, int(asr_model.get("sample_rate") or ASR_DEFAULT_SAMPLE_RATE))
+        timer.log_timestamp("audio_normalized")
+        question = await get_asr(audio_file, asr_model["access-token"], model_upstreams(asr_model), normalized_audio)
+        timer.log_timestamp("asr_completed")
 
+    timer.log_timestamp("question_processed")
+    return question
+
+
+async def translate_question(question: str, language: str, timer: RequestTimer):
     # Translate if needed (raw text only)
-    if language.lower() != "english":
-        translation_start = time.time()
-        translation_model = await models_collection.find_one({"sourcelanguage": language, "targetlanguage": "English"})
-        if not translation_model:
-            raise HTTPException(status_code=500, detail="Translation model not found")
-        translated_question = await get_translation(question, translation_model["access-token"], translation_model["api_url"])
-        log_timestamp("translation_to_english_completed")
-    else:
-        translated_question = question
+    if language.lower() == "english":
+        return question
 
+    translation_model = await model_registry.get(source=language, target="English")
+    if not translation_model:
+        raise HTTPException(status_code=500, detail="Translation model not found")
+    translated_question = await get_translation(question, translation_model["access-token"], model_upstreams(translation_model))
+    timer.log_timestamp("translation_to_english_completed")
+    return translated_question
+
+
+def parse_chatbot_response(chatbot_response: dict, session_id: str):
+    raw_response_text = chatbot_response.get("response", "Chatbot did not return a response")
+    summarized_response = chatbot_response.get("summarized_response", raw_response_text)  # Fallback to full response if no summary
+    session_id = chatbot_response.get("session_id", session_id)
+    return raw_response_text, summarized_response, session_id
+
+
+async def fetch_chatbot_response(translated_question: str, session_id: str):
     # Call chatbot API with session_id
-    chatbot_api_url = f"{CHATBOT_API_URL}/{session_id}"
-    
-    chatbot_start = time.time()
-    async with aiohttp.ClientSession() as session:
-        async with session.post(chatbot_api_url, json={"message": translated_question}) as response:
+    session = HTTPClient.get_session()
+
+    async def request(base_url: str):
+        async with session.post(f"{base_url}/{session_id}", json={"message": translated_question}) as response:
             if response.status == 200:
                 chatbot_response = await response.json()
-                raw_response_text = chatbot_response.get("response", "Chatbot did not return a response")
-                summarized_response = chatbot_response.get("summarized_response", raw_response_text)  # Fallback to full response if no summary
-                session_id = chatbot_response.get("session_id", session_id)
-                log_timestamp("chatbot_response_received")
+                return parse_chatbot_response(chatbot_response, session_id)
             else:
                 raise HTTPException(status_code=500, detail="Chatbot API error")
 
+    # Conversations are stateful upstream, so the chatbot is never hedged or failed over
+    return await call_upstream([CHATBOT_UPSTREAM], request, CHATBOT_TIMEOUT_SECONDS)
+
+
+async def get_chatbot_response(translated_question: str, session_id: str, timer: RequestTimer):
+    """Returns (raw_response_text, summarized_response, session_id)."""
+    if not answer_cache.is_cacheable(session_id):
+        result = await fetch_chatbot_response(translated_question, session_id)
+        timer.log_timestamp("chatbot_response_received")
+        return result
+
+    # Stateless questions are answered from cache, or share one in-flight upstream call.
+    # fetch_answer only runs for the request that makes the call, so only that request
+    # gets the session the upstream created; the cached answer itself is stateless.
+    created_session = {}
+
+    async def fetch_answer():
+        raw_response_text, summarized_response, created_session["id"] = await fetch_chatbot_response(translated_question, session_id)
+        return raw_response_text, summarized_response
+
+    raw_response_text, summarized_response = await answer_cache.get_or_fetch(translated_question, fetch_answer)
+    timer.log_timestamp("chatbot_response_received")
+    return raw_response_text, summarized_response, created_session.get("id", session_id)
+
+
+async def stream_chatbot_response(translated_question: str, session_id: str, timer: RequestTimer):
+    """
+    Yields ("token", text) for every chunk when the chatbot upstream streams
+    (text/event-stream), then a final ("result", (raw, summary, session_id)).
+    Non-streaming upstreams only yield the final result.
+    """
+    if not answer_cache.is_cacheable(session_id):
+        async for event in post_chatbot_stream(translated_question, session_id, timer, cacheable=False):
+            yield event
+        return
+
+    cached_answer = answer_cache.get(translated_question)
+    if cached_answer is None:
+        # An identical question is already being answered (streamed or not): wait for it
+        in_flight = answer_cache.join(translated_question)
+        if in_flight is not None:
+            try:
+                cached_answer = await in_flight
+            except CallAbandoned:
+                pass
+    if cached_answer is not None:
+        timer.log_timestamp("chatbot_response_received")
+        yield "result", (cached_answer[0], cached_answer[1], session_id)
+        return
+
+    shared_answer = answer_cache.lead(translated_question)
+    try:
+        async for kind, value in post_chatbot_stream(translated_question, session_id, timer, cacheable=True):
+            if kind == "result":
+                # Resolved before yielding: the client may disconnect once it has the result
+                shared_answer.set_result(value[:2])
+            yield kind, value
+    except Exception as e:
+        if not shared_answer.done():
+            shared_answer.set_exception(e)
+        raise
+    finally:
+        if not shared_answer.done():
+            # Client went away mid-stream; waiting requests make their own call
+            shared_answer.set_exception(CallAbandoned())
+
+
+async def post_chatbot_stream(translated_question: str, session_id: str, timer: RequestTimer, cacheable: bool):
+    chatbot_api_url = f"{CHATBOT_API_URL}/{session_id}"
+    headers = {"Accept": "text/event-stream, application/json"}
+
+    # The whole stream, including reading tokens, has to fit in the budget
+    timeout = aiohttp.ClientTimeout(total=call_budget(CHATBOT_TIMEOUT_SECONDS))
+
+    session = HTTPClient.get_session()
+    async with guarded(CHATBOT_UPSTREAM.name), session.post(chatbot_api_url, json={"message": translated_question}, headers=headers, timeout=timeout) as response:
+        if response.status != 200:
+            raise HTTPException(status_code=500, detail="Chatbot API error")
+
+        if response.content_type != "text/event-stream":
+            chatbot_response = await response.json()
+            timer.log_timestamp("chatbot_response_received")
+            result = parse_chatbot_response(chatbot_response, session_id)
+            if cacheable:
+                answer_cache.set(translated_question, result[:2])
+            yield "result", result
+            return
+
+        tokens = []
+        chatbot_response = None
+        async for line in response.content:
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if not data or data == "[DONE]":
+                continue
+
+            try:
+                payload = json.loads(data)
+            except ValueError:
+                payload = {"token": data}
+
+            if not isinstance(payload, dict):
+                continue
+            if "response" in payload:
+                # Final event carrying the complete answer
+                chatbot_response = payload
+            elif payload.get("token"):
+                tokens.append(payload["token"])
+                yield "token", payload["token"]
+
+        if chatbot_response is None:
+            chatbot_response = {"response": "".join(tokens)} if tokens else {}
+        timer.log_timestamp("chatbot_response_received")
+        result = parse_chatbot_response(chatbot_response, session_id)
+        if cacheable and chatbot_response:
+            answer_cache.set(translated_question, result[:2])
+        yield "result", result
+
+
+async def format_and_translate_answer(raw_response_text: str, summarized_response: str, language: str, timer: RequestTimer):
+    """Returns (raw_response_text, summarized_response, formatted_response, formatted_summary)."""
     formatted_response = await format_response_as_bullets(raw_response_text, language)
     formatted_summary = await format_response_as_bullets(summarized_response, language)
+    timer.log_timestamp("response_formatting_completed")
 
-    # Reverse translation if needed - PRIORITIZE SUMMARIZED RESPONSE FIRST
+    # Reverse translation if needed - summary and full response are translated concurrently
     if language.lower() != "english":
-        reverse_translation_start = time.time()
-        translation_model = await models_collection.find_one({"sourcelanguage": "English", "targetlanguage": language})
+        translation_model = await model_registry.get(source="English", target=language)
         if not translation_model:
             raise HTTPException(status_code=500, detail="Reverse translation model not found")
         
-        # Translate summarized version first
-        summarized_response = await get_translation(formatted_summary, translation_model["access-token"], translation_model["api_url"])
-        
-        # Then translate full response if different from summarized
-        if summarized_response != raw_response_text:
-            raw_response_text = await get_translation(formatted_response, translation_model["access-token"], translation_model["api_url"])
+        access_token, upstreams = translation_model["access-token"], model_upstreams(translation_model)
+        if formatted_summary == formatted_response:
+            # Identical texts only need one upstream call
+            summarized_response = await get_translation(formatted_summary, access_token, upstreams)
+            raw_response_text = summarized_response
+        else:
+            summarized_response, raw_response_text = await gather_or_cancel(
+                get_translation(formatted_summary, access_token, upstreams),
+                get_translation(formatted_response, access_token, upstreams)
+            )
         
-        log_timestamp("translation_to_original_completed")
-    
-    
+        timer.log_timestamp("translation_to_original_completed")
+
+    return raw_response_text, summarized_response, formatted_response, formatted_summary
+
+
+async def store_message(
+    conversation_id,
+    user_id: str,
+    original_question: str,
+    raw_response_text: str,
+    summarized_response: str,
+    formatted_response: str,
+    formatted_summary: str,
+    timer: RequestTimer
+):
+    """Stores the message with TTS pending and returns (message_id, timestamp)."""
     # Create message ID for tracking
     message_id = ObjectId()
     current_time = datetime.utcnow()
@@ -280,14 +432,191 @@ async def store_chat_message(
         "tts_summary_status": "processing"  # New field
     }
 
-    # Store the initial message in the conversation
-    db_store_start = time.time()
-    await conversation_collection.update_one(
-        {"_id": ObjectId(conversation_id)},
-        {"$push": {"messages": initial_message}},
-        upsert=True
+    # Store the initial message in the messages collection
+    await message_store.insert(conversation_id, initial_message)
+    await message_store.touch_conversation(conversation_id, title=original_question)
+    timer.log_timestamp("database_store_completed")
+
+    return message_id, current_time
+
+
+async def synthesize_tts(clean_text: str, language: str) -> str:
+    """TTS job handler: returns the s3_url for `clean_text`, reusing cached audio when possible."""
+    # Another job may have synthesized the same text since this one was queued
+    s3_url = await tts_cache.get(clean_text, language)
+    if s3_url:
+        return s3_url
+
+    tts_model = await model_registry.get(model_type="tts", source=language)
+    if not tts_model:
+        raise RuntimeError(f"TTS model not found for {language}")
+
+    started = time.monotonic()
+    s3_url = await get_tts(clean_text, tts_model["access-token"], model_upstreams(tts_model))
+    observe_stage("tts", language, time.monotonic() - started)
+    await tts_cache.set(clean_text, language, "male", s3_url)
+    return s3_url
+
+
+TTS_STATE_FIELDS = ("tts_status", "tts_url", "tts_summary_status", "tts_summary_url")
+
+
+def publish_tts_update(conversation_id, message_id, fields: dict):
+    """Pushes settled TTS fields to subscribers of the message and of its conversation."""
+    event = {"event": "tts", "message_id": str(message_id), "conversation_id": str(conversation_id)}
+    event.update({field: fields[field] for field in TTS_STATE_FIELDS if field in fields})
+    pubsub.publish(message_topic(message_id), event)
+    pubsub.publish(conversation_topic(conversation_id), event)
+
+
+def on_tts_job_settled(job: dict, s3_url: Optional[str], tts_status: str):
+    # With the change stream relay enabled every process publishes from the relay instead
+    if not NOTIFICATIONS_CHANGE_STREAM:
+        publish_tts_update(job["conversation_id"], job["message_id"], settled_tts_fields(job["targets"], s3_url, tts_status))
+
+
+def tts_job_change_to_events(change: dict):
+    job = change.get("fullDocument")
+    if not job or job.get("status") not in ("done", "failed"):
+        return []
+    tts_status = "completed" if job["status"] == "done" else "failed"
+    fields = settled_tts_fields(job["targets"], job.get("s3_url"), tts_status)
+    event = {"event": "tts", "message_id": str(job["message_id"]), "conversation_id": str(job["conversation_id"])}
+    event.update(fields)
+    return [
+        (message_topic(job["message_id"]), event),
+        (conversation_topic(job["conversation_id"]), event)
+    ]
+
+
+tts_jobs_collection = db["tts_jobs"]
+tts_queue = TTSJobQueue(tts_jobs_collection, message_store, synthesize=synthesize_tts, on_settled=on_tts_job_settled)
+tts_change_relay = ChangeStreamRelay(
+    pubsub,
+    tts_jobs_collection,
+    [{"$match": {"operationType": "update", "updateDescription.updatedFields.status": {"$in": ["done", "failed"]}}}],
+    tts_job_change_to_events
+)
+
+
+async def schedule_tts(conversation_id, message_id: ObjectId, language: str, summarized_response: str, raw_response_text: str):
+    """
+    Completes the message right away for audio that is already cached and
+    queues TTS jobs for the rest (summary first). Returns the current TTS state.
+    """
+    tts_state = {
+        "tts_status": "processing",
+        "tts_url": None,
+        "tts_summary_status": "processing",
+        "tts_summary_url": None
+    }
+    try:
+        clean_summary = clean_text_for_tts(summarized_response)
+        clean_text = clean_text_for_tts(raw_response_text)
+        same_text = summarized_response == raw_response_text
+
+        # Previously synthesized audio is reused without queueing a job
+        if same_text:
+            tts_summary_url = tts_url = await tts_cache.get(clean_summary, language)
+        else:
+            tts_summary_url, tts_url = await gather_or_cancel(
+                tts_cache.get(clean_summary, language),
+                tts_cache.get(clean_text, language)
+            )
+
+        update_fields = {}
+        if tts_summary_url:
+            tts_state.update({"tts_summary_url": tts_summary_url, "tts_summary_status": "completed"})
+            update_fields.update({
+                "tts_summary_url": tts_summary_url,
+                "tts_summary_status": "completed"
+            })
+        if tts_url:
+            tts_state.update({"tts_url": tts_url, "tts_status": "completed"})
+            update_fields.update({
+                "tts_url": tts_url,
+                "tts_status": "completed"
+            })
+        if update_fields:
+            update_fields["updated_at"] = datetime.utcnow()
+            await message_store.update_fields(message_id, update_fields)
+            publish_tts_update(conversation_id, message_id, tts_state)
+
+        if same_text:
+            if not tts_summary_url:
+                await tts_queue.enqueue(conversation_id, message_id, language, clean_summary, ["summary", "full"])
+        else:
+            enqueues = []
+            if not tts_summary_url:
+                enqueues.append(tts_queue.enqueue(conversation_id, message_id, language, clean_summary, ["summary"]))
+            if not tts_url:
+                enqueues.append(tts_queue.enqueue(conversation_id, message_id, language, clean_text, ["full"]))
+            await gather_or_cancel(*enqueues)
+
+    except Exception as e:
+        print(f"Error scheduling TTS: {str(e)}")
+        failed_fields = {"updated_at": datetime.utcnow()}
+        for status_field in ("tts_status", "tts_summary_status"):
+            if tts_state[status_field] == "processing":
+                tts_state[status_field] = "failed"
+                failed_fields[status_field] = "failed"
+        await message_store.update_fields(message_id, failed_fields)
+
+    return tts_state
+
+
+async def get_message_tts_state(conversation_id, message_id: ObjectId) -> dict:
+    message = await message_store.find(message_id) or {}
+    return {
+        "tts_status": message.get("tts_status", "unknown"),
+        "tts_url": message.get("tts_url"),
+        "tts_summary_status": message.get("tts_summary_status", "unknown"),
+        "tts_summary_url": message.get("tts_summary_url")
+    }
+
+
+@ask_router.post("/ask/{conversation_id}", dependencies=[Depends(start_request_timer), Depends(limit_ask)])
+async def store_chat_message(
+    conversation_id: str = Path(...),
+    principal: Principal = Depends(get_principal),
+    timer: RequestTimer = Depends(start_request_timer),
+    question: Optional[str] = Form(None),
+    language: str = Form("English"),
+    audio_file: Optional[UploadFile] = File(None)
+):
+    # Dependencies (rate limit, principal) have run; the timer started before them
+    timer.log_timestamp("authentication_complete")
+    timer.language = language
+    # Every upstream call below shares this budget
+    start_deadline()
+    
+    user_id = principal.user_id
+    
+    if not question and not audio_file:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Either text or audio input is required")
+    await validate_audio_upload(audio_file)
+    timer.log_timestamp("upload_validated")
+
+    conversation_id, session_id = await resolve_conversation(conversation_id, user_id, language, timer)
+
+    question = await recognize_question(question, audio_file, language, timer)
+    original_question = question
+
+    translated_question = await translate_question(question, language, timer)
+
+    raw_response_text, summarized_response, session_id = await get_chatbot_response(translated_question, session_id, timer)
+
+    raw_response_text, summarized_response, formatted_response, formatted_summary = await format_and_translate_answer(
+        raw_response_text, summarized_response, language, timer
+    )
+
+    message_id, current_time = await store_message(
+        conversation_id, user_id, original_question, raw_response_text, summarized_response,
+        formatted_response, formatted_summary, timer
     )
-    log_timestamp("database_store_completed")
+
+    # Audio is synthesized by the TTS workers; cached audio completes immediately
+    tts_state = await schedule_tts(conversation_id, message_id, language, summarized_response, raw_response_text)
 
     # Prepare updated response data
     response_data = {
@@ -301,90 +630,138 @@ async def store_chat_message(
             "question": original_question,
             "response": raw_response_text,
             "summarized_response": summarized_response,  # New field
-            "tts_output": None,
-            "tts_summary_output": None,  # New field
-            "tts_status": "processing",
-            "tts_summary_status": "processing",  # New field
+            "tts_output": tts_state["tts_url"],
+            "tts_summary_output": tts_state["tts_summary_url"],  # New field
+            "tts_status": tts_state["tts_status"],
+            "tts_summary_status": tts_state["tts_summary_status"],  # New field
             "timestamp": current_time.isoformat()
         }
     }
+    
+    # Log pre-TTS timestamps
+    timer.log_timestamp("response_prepared")
+    
+    # Record stage latencies (without TTS data)
+    timer.finish()
+
+    return response_data
+
+
+def format_sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@ask_router.post("/ask/{conversation_id}/stream", dependencies=[Depends(start_request_timer), Depends(limit_ask)])
+async def stream_chat_message(
+    conversation_id: str = Path(...),
+    principal: Principal = Depends(get_principal),
+    timer: RequestTimer = Depends(start_request_timer),
+    question: Optional[str] = Form(None),
+    language: str = Form("English"),
+    audio_file: Optional[UploadFile] = File(None)
+):
+    """
+    Server-Sent-Events variant of /ask/{conversation_id}. Emits one event per
+    completed stage: recognized_text, token (English only, when the chatbot
+    upstream streams), summarized_response, full_response, message_id, tts
+    and finally done. Failures after the stream has started are sent as an
+    error event.
+    """
+    # Dependencies (rate limit, principal) have run; the timer started before them
+    timer.log_timestamp("authentication_complete")
+    timer.language = language
+    # Every upstream call below shares this budget
+    start_deadline()
+
+    user_id = principal.user_id
+
+    if not question and not audio_file:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Either text or audio input is required")
+    await validate_audio_upload(audio_file)
+    timer.log_timestamp("upload_validated")
+
+    conversation_id, session_id = await resolve_conversation(conversation_id, user_id, language, timer)
 
-    # Background task to process TTS and update the messages
-    async def process_tts_and_update():
+    # The upload is only guaranteed to be open while the handler runs, so ASR happens before streaming
+    question = await recognize_question(question, audio_file, language, timer)
+
+    async def event_stream():
+        nonlocal session_id
+        original_question = question
         try:
-            tts_model = await models_collection.find_one({"sourcelanguage": language, "model_type": "tts"})
-            if tts_model:
-                # Process SUMMARY first
-                clean_summary = clean_text_for_tts(summarized_response)
-                tts_summary_url = await get_tts(clean_summary, tts_model["access-token"], tts_model["api_url"])
-                
-                # Then process FULL response if different
-                if summarized_response != raw_response_text:
-                    clean_text = clean_text_for_tts(raw_response_text)
-                    tts_url = await get_tts(clean_text, tts_model["access-token"], tts_model["api_url"])
+            yield format_sse_event("recognized_text", {
+                "conversation_id": str(conversation_id),
+                "recognized_text": original_question
+            })
+
+            translated_question = await translate_question(original_question, language, timer)
+
+            # Tokens are English, so only relay them when no reverse translation follows
+            relay_tokens = language.lower() == "english"
+            chatbot_result = None
+            async for kind, value in stream_chatbot_response(translated_question, session_id, timer):
+                if kind == "token":
+                    if relay_tokens:
+                        yield format_sse_event("token", {"text": value})
                 else:
-                    tts_url = tts_summary_url  # Use same audio if identical
-
-                # Update message with both TTS URLs
-                await conversation_collection.update_one(
-                    {
-                        "_id": ObjectId(conversation_id),
-                        "messages._id": message_id
-                    },
-                    {
-                        "$set": {
-                            "messages.$.tts_url": tts_url,
-                            "messages.$.tts_summary_url": tts_summary_url,
-                            "messages.$.tts_status": "completed",
-                            "messages.$.tts_summary_status": "completed",
-                            "updated_at": datetime.utcnow()
-                        }
-                    }
-                )
-                
-        except Exception as e:
-            print(f"Error in TTS background task: {str(e)}")
-            # Update both statuses if TTS fails
-            await conversation_collection.update_one(
-                {
-                    "_id": ObjectId(conversation_id),
-                    "messages._id": message_id
-                },
-                {
-                    "$set": {
-                        "messages.$.tts_status": "failed",
-                        "messages.$.tts_summary_status": "failed",
-                        "updated_at": datetime.utcnow()
-                    }
-                }
+                    chatbot_result = value
+            raw_response_text, summarized_response, session_id = chatbot_result
+
+            raw_response_text, summarized_response, formatted_response, formatted_summary = await format_and_translate_answer(
+                raw_response_text, summarized_response, language, timer
             )
+            yield format_sse_event("summarized_response", {"summarized_response": summarized_response})
+            yield format_sse_event("full_response", {"response": raw_response_text})
 
-    background_tasks.add_task(process_tts_and_update)
-    
-    # Log pre-TTS timestamps
-    log_timestamp("response_prepared")
-    
-    # Write initial timestamps to file (without TTS data)
-    with open("performance_logs.txt", "a") as f:
-        f.write(f"\n\n=== Request at {datetime.now().isoformat()} ===\n")
-        for step, data in timestamps["steps"].items():
-            f.write(f"{step}: {data['elapsed']:.3f}s\n")
-        f.write(f"Pre-TTS total time: {time.time() - timestamps['start_time']:.3f}s\n")
+            message_id, current_time = await store_message(
+                conversation_id, user_id, original_question, raw_response_text, summarized_response,
+                formatted_response, formatted_summary, timer
+            )
+            yield format_sse_event("message_id", {
+                "message_id": str(message_id),
+                "conversation_id": str(conversation_id),
+                "session_id": session_id,
+                "timestamp": current_time.isoformat()
+            })
+            timer.log_timestamp("response_prepared")
+            timer.finish()
+
+            # TTS jobs are durable, so a client disconnect while waiting loses nothing.
+            # Subscribe before scheduling so no completion is missed.
+            with pubsub.subscribe(message_topic(message_id)) as subscription:
+                tts_state = await schedule_tts(conversation_id, message_id, language, summarized_response, raw_response_text)
+                yield format_sse_event("tts", tts_state)
+
+                deadline = time.monotonic() + TTS_STREAM_WAIT_SECONDS
+                while "processing" in (tts_state["tts_status"], tts_state["tts_summary_status"]):
+                    event = await subscription.get(timeout=max(0, deadline - time.monotonic()))
+                    if event is None:
+                        # Not settled in time; report whatever is stored
+                        tts_state = await get_message_tts_state(conversation_id, message_id)
+                        yield format_sse_event("tts", tts_state)
+                        break
+                    tts_state.update({field: event[field] for field in TTS_STATE_FIELDS if field in event})
+                    yield format_sse_event("tts", tts_state)
+            yield format_sse_event("done", {"status": "success"})
+
+        except HTTPException as e:
+            yield format_sse_event("error", {"status": "error", "detail": e.detail, "code": e.status_code})
+        except Exception as e:
+            print(f"Error in streaming ask: {str(e)}")
+            yield format_sse_event("error", {"status": "error", "detail": "Internal server error", "code": 500})
 
-    return response_data
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @ask_router.delete("/conversation/{conversation_id}")
 async def delete_conversation(
     conversation_id: str = Path(...),
-    token: str = Depends(oauth2_scheme)
+    principal: Principal = Depends(require_user)
 ):
-    user = decode_access_token(token)
-    if "error" in user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
-    
-    user_id = user.get("user_id")
-    if not user_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token")
+    user_id = principal.user_id
     
     try:
         conversation_obj_id = ObjectId(conversation_id)
@@ -396,6 +773,7 @@ async def delete_conversation(
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     await conversation_collection.delete_one({"_id": conversation_obj_id})
+    await message_store.delete_for_conversation(conversation_obj_id)
     
     return {
         "status": "success",
@@ -408,14 +786,10 @@ async def delete_conversation(
 @ask_router.get("/message/{message_id}")
 async def get_message_status(
     message_id: str = Path(...),
-    token: Optional[str] = Depends(get_optional_token)  # Using our custom optional token dependency
+    principal: Principal = Depends(get_principal)
 ):
     # Authentication - handle both authenticated and guest users
-    user_id = "guest"  # Default to guest user
-    if token:
-        user = decode_access_token(token)
-        if "error" not in user:
-            user_id = user.get("user_id")
+    user_id = principal.user_id
     
     # Validate message ID format
     try:
@@ -423,31 +797,19 @@ async def get_message_status(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid message ID format")
     
-    # Build query based on user type
-    query = {
-        "messages._id": message_obj_id
-    }
-    
-    # For authenticated users, add user_id check
-    if user_id != "guest":
-        query["user_id"] = ObjectId(user_id)
-    # For guest users, we only check the message_id
-    
-    # Find any conversation containing this message
-    conversation = await conversation_collection.find_one(
-        query,
-        {"messages.$": 1}  # Only return the matching message
+    # Authenticated users only see their own messages; guests are checked by message_id only
+    message, user_vote = await asyncio.gather(
+        message_store.find(message_obj_id, user_id),
+        get_user_vote(message_obj_id, user_id)
     )
     
-    if not conversation or not conversation.get("messages"):
+    if not message:
         raise HTTPException(
             status_code=404,
             detail="Message not found or you don't have permission to access it"
         )
     
-    message = conversation["messages"][0]
-    
-    return {
+    return MongoJSONResponse({
         "status": "success",
         "data": {
             "tts_status": message.get("tts_status", "unknown"),
@@ -457,7 +819,8 @@ async def get_message_status(
             "last_updated": message.get("timestamp"),
             "like_count": message.get("like_count", 0),
             "dislike_count": message.get("dislike_count", 0),
-            "feedback": message.get("feedback"),
-            "vote": message.get("vote") 
+            # The caller's own vote
+            "feedback": user_vote.get("feedback") if user_vote else None,
+            "vote": user_vote.get("vote") if user_vote else None
         }
-    }
+    })
@@ -0,0 +1,200 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+from fastapi import UploadFile
+
+from chat.audio_upload import upload_size
+
+AUDIO_PREPROCESS_ENABLED = os.getenv("AUDIO_PREPROCESS_ENABLED", "true").lower() == "true"
+AUDIO_PREPROCESS_WORKERS = int(os.getenv("AUDIO_PREPROCESS_WORKERS", "2"))
+# Larger clips are streamed to ASR unchanged instead of being read into memory and
+# copied to a worker; 2 MB is about a minute of 16 kHz 16-bit mono
+AUDIO_PREPROCESS_MAX_BYTES = int(os.getenv("AUDIO_PREPROCESS_MAX_BYTES", str(2 * 1024 * 1024)))
+# Used when the ASR model document has no sample_rate
+ASR_DEFAULT_SAMPLE_RATE = int(os.getenv("ASR_DEFAULT_SAMPLE_RATE", "16000"))
+# Frames quieter than this (dBFS) at either end of the clip are trimmed
+AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-40"))
+AUDIO_SILENCE_FRAME_MS = int(os.getenv("AUDIO_SILENCE_FRAME_MS", "20"))
+# Kept around the speech so word onsets and endings are not clipped
+AUDIO_SILENCE_PADDING_MS = int(os.getenv("AUDIO_SILENCE_PADDING_MS", "200"))
+RESAMPLE_FILTER_TAPS = 101
+# Workers are started by a clean forkserver process, never forked from the threaded server
+AUDIO_PREPROCESS_START_METHOD = os.getenv("AUDIO_PREPROCESS_START_METHOD", "forkserver")
+
+
+def decode_wav(data: bytes):
+    """Returns (float32 samples in [-1, 1] shaped (frames, channels), sample rate) for PCM WAV."""
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif sample_width == 3:
+        # Little-endian 24-bit: widen to 32-bit by placing the three bytes in the high end
+        triplets = np.frombuffer(raw[:len(raw) - len(raw) % 3], dtype=np.uint8).reshape(-1, 3)
+        widened = np.zeros((len(triplets), 4), dtype=np.uint8)
+        widened[:, 1:] = triplets
+        samples = widened.view("<i4").reshape(-1).astype(np.float32) / 2147483648
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+
+    frames = len(samples) // channels
+    return samples[:frames * channels].reshape(frames, channels), rate
+
+
+def resample(signal: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Windowed-sinc low-pass (when downsampling) followed by linear interpolation."""
+    if source_rate == target_rate or len(signal) < 2:
+        return signal
+    if target_rate < source_rate:
+        # Cutoff just below the target Nyquist, in cycles per source sample
+        cutoff = 0.45 * target_rate / source_rate
+        n = np.arange(RESAMPLE_FILTER_TAPS) - (RESAMPLE_FILTER_TAPS - 1) / 2
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(RESAMPLE_FILTER_TAPS)
+        signal = np.convolve(signal, taps / taps.sum(), mode="same")
+    duration = len(signal) / source_rate
+    target_times = np.arange(int(duration * target_rate)) / target_rate
+    return np.interp(target_times, np.arange(len(signal)) / source_rate, signal).astype(np.float32)
+
+
+def trim_silence(signal: np.ndarray, rate: int, threshold_db: float, frame_ms: int, padding_ms: int) -> np.ndarray:
+    """Drops leading and trailing frames whose RMS energy is below threshold_db."""
+    frame_length = max(1, rate * frame_ms // 1000)
+    frame_count = len(signal) // frame_length
+    if frame_count == 0:
+        return signal
+    frames = signal[:frame_count * frame_length].reshape(frame_count, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    loud = np.flatnonzero(20 * np.log10(np.maximum(rms, 1e-10)) > threshold_db)
+    if len(loud) == 0:
+        # Nothing above the threshold: leave the clip to the ASR service as is
+        return signal
+    padding = rate * padding_ms // 1000
+    start = max(0, loud[0] * frame_length - padding)
+    end = min(len(signal), (loud[-1] + 1) * frame_length + padding)
+    return signal[start:end]
+
+
+def encode_wav(signal: np.ndarray, rate: int) -> bytes:
+    pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def warm_up() -> int:
+    # Runs once per worker at startup so the first voice request finds NumPy imported
+    return os.getpid()
+
+
+def normalize_wav(data: bytes, target_rate: int) -> bytes:
+    """Mono, `target_rate`, silence-trimmed 16-bit PCM WAV. Runs in a worker process."""
+    samples, rate = decode_wav(data)
+    mono = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    mono = resample(mono, rate, target_rate)
+    mono = trim_silence(mono, target_rate, AUDIO_SILENCE_THRESHOLD_DB, AUDIO_SILENCE_FRAME_MS, AUDIO_SILENCE_PADDING_MS)
+    return encode_wav(mono, target_rate)
+
+
+class AudioPreprocessor:
+    """
+    Normalizes uploaded WAV clips for ASR in a process pool, keeping the
+    NumPy work off the event loop and out of the GIL. Anything that is not
+    a decodable PCM WAV is left for the caller to forward unchanged.
+    """
+
+    def __init__(self, max_workers: int):
+        self._max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.normalized = 0
+        self.skipped = 0
+        self.oversized = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context(AUDIO_PREPROCESS_START_METHOD)
+            )
+        return self._executor
+
+    async def start(self):
+        """Starts the worker processes and waits until each has imported this module."""
+        if not AUDIO_PREPROCESS_ENABLED:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, warm_up) for _ in range(self._max_workers)))
+
+    async def normalize(self, audio_file: UploadFile, target_rate: int) -> Optional[bytes]:
+        """Returns the normalized WAV, or None if the original upload should be sent."""
+        if not AUDIO_PREPROCESS_ENABLED:
+            return None
+        await audio_file.seek(0)
+        header = await audio_file.read(12)
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            self.skipped += 1
+            return None
+
+        if upload_size(audio_file) > AUDIO_PREPROCESS_MAX_BYTES:
+            self.oversized += 1
+            return None
+
+        # The worker needs the whole clip in memory, hence the cap above
+        await audio_file.seek(0)
+        data = await audio_file.read()
+        try:
+            normalized = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), normalize_wav, data, target_rate
+            )
+        except Exception as e:
+            print(f"Audio normalization failed, sending original: {str(e)}")
+            self.failed += 1
+            return None
+
+        self.normalized += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(normalized)
+        return normalized
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": AUDIO_PREPROCESS_ENABLED,
+            "workers": self._max_workers,
+            "max_bytes": AUDIO_PREPROCESS_MAX_BYTES,
+            "normalized": self.normalized,
+            "skipped": self.skipped,
+            "oversized": self.oversized,
+            "failed": self.failed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "compression_ratio": round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None,
+        }
+
+
+audio_preprocessor = AudioPreprocessor(AUDIO_PREPROCESS_WORKERS)
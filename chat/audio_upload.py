@@ -0,0 +1,105 @@
+import os
+import wave
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+ASR_MAX_UPLOAD_BYTES = int(os.getenv("ASR_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+ASR_MAX_DURATION_SECONDS = float(os.getenv("ASR_MAX_DURATION_SECONDS", "60"))
+ASR_UPLOAD_CHUNK_BYTES = int(os.getenv("ASR_UPLOAD_CHUNK_BYTES", str(64 * 1024)))
+# Allowance for the other form fields and multipart boundaries
+FORM_OVERHEAD_BYTES = 64 * 1024
+# Routes that accept an audio_file upload
+AUDIO_UPLOAD_PATH_PREFIX = "/ask/"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware: refuses an /ask request whose declared Content-Length
+    cannot fit the audio limit before its body is read and spooled. Every
+    other request is passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int = ASR_MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].startswith(AUDIO_UPLOAD_PATH_PREFIX):
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_bytes:
+                        response = JSONResponse(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            content={"detail": f"Audio file exceeds {ASR_MAX_UPLOAD_BYTES} bytes"}
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+
+def upload_size(audio_file: UploadFile) -> int:
+    spool = audio_file.file
+    position = spool.tell()
+    spool.seek(0, os.SEEK_END)
+    size = spool.tell()
+    spool.seek(position)
+    return size
+
+
+def wav_duration(audio_file: UploadFile, size: int) -> Optional[float]:
+    """Duration from the WAV header, or None if the upload is not a readable WAV."""
+    spool = audio_file.file
+    spool.seek(0)
+    try:
+        with wave.open(spool, "rb") as wav:
+            frame_bytes = wav.getnchannels() * wav.getsampwidth()
+            frames = wav.getnframes()
+            frame_rate = wav.getframerate()
+    except (wave.Error, EOFError):
+        return None
+    finally:
+        spool.seek(0)
+    if not frame_rate or not frame_bytes:
+        return None
+    # Streamed WAVs may declare a placeholder length; the bytes present bound it
+    return min(frames, size // frame_bytes) / frame_rate
+
+
+def check_upload(audio_file: UploadFile):
+    size = upload_size(audio_file)
+    if size == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Audio file is empty")
+    if size > ASR_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Audio file exceeds {ASR_MAX_UPLOAD_BYTES} bytes"
+        )
+    duration = wav_duration(audio_file, size)
+    if duration is not None and duration > ASR_MAX_DURATION_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Audio is longer than {ASR_MAX_DURATION_SECONDS:g} seconds"
+        )
+
+
+async def validate_audio_upload(audio_file: Optional[UploadFile]):
+    """Rejects an empty, too large or too long clip; run it before any DB work."""
+    if audio_file is None:
+        return
+    # Large uploads are spooled to disk, so the checks run off the event loop
+    await run_in_threadpool(check_upload, audio_file)
+
+
+async def iter_upload_chunks(audio_file: UploadFile, chunk_size: int = ASR_UPLOAD_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """Streams the upload's spool from the start without reading it into memory at once."""
+    await audio_file.seek(0)
+    while True:
+        chunk = await audio_file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import re
+import time
+from typing import Dict, Optional, Pattern
+
+from db import MongoDB
+
+db = MongoDB.get_db()
+forms_collection = db["Forms"]
+
+FORMS_CACHE_TTL_SECONDS = float(os.getenv("FORMS_CACHE_TTL_SECONDS", "300"))
+
+# Extracts the identifier ("1A", "12", ...) from a stored form name
+FORM_NAME_PATTERN = re.compile(r"form[-\s]*(\d*[a-zA-Z]?\d*)", re.IGNORECASE)
+
+# Normalizes "Form No" / "Form Number" variations into "Form <id>"
+FORM_NORMALIZE_PATTERN = re.compile(
+    r"form(?:[-\s]+(?:no\.?|number))?[-\s]*\n?\s*(\d*[a-zA-Z]?\d*)",
+    re.IGNORECASE
+)
+
+
+class FormLinkIndex:
+    """
+    In-memory index of form identifiers to their links.
+    All identifiers are compiled into a single alternation so a response is
+    rewritten in one pass. The index reloads itself after `ttl_seconds`, or
+    immediately through `reload()` / `invalidate()`.
+    """
+
+    def __init__(self, collection, ttl_seconds: float = FORMS_CACHE_TTL_SECONDS):
+        self._collection = collection
+        self._ttl_seconds = ttl_seconds
+        self._links: Dict[str, str] = {}
+        self._pattern: Optional[Pattern] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at > self._ttl_seconds
+
+    async def reload(self):
+        forms_data = await self._collection.find(
+            {}, {"form_name": 1, "aws_link": 1}
+        ).to_list(length=None)
+
+        links = {}
+        for form in forms_data:
+            match = FORM_NAME_PATTERN.search(form.get("form_name", ""))
+            if match and match.group(1) and form.get("aws_link"):
+                links[match.group(1).lower()] = form["aws_link"]
+
+        pattern = None
+        if links:
+            # Longest identifiers first so "12" is not matched as "1" + "2"
+            alternation = "|".join(
+                re.escape(identifier)
+                for identifier in sorted(links, key=len, reverse=True)
+            )
+            pattern = re.compile(
+                rf"(?<!\w)(?:Form(?:[-\s]+(?:No\.?|Number))?[-\s]*)({alternation})(?!\w)",
+                re.IGNORECASE
+            )
+
+        self._links = links
+        self._pattern = pattern
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def ensure_fresh(self):
+        if not self._is_stale():
+            return
+        async with self._lock:
+            # Another request may have reloaded while we were waiting
+            if self._is_stale():
+                await self.reload()
+
+    async def rewrite(self, response_text: str) -> str:
+        await self.ensure_fresh()
+
+        response_text = FORM_NORMALIZE_PATTERN.sub(r"Form \1", response_text)
+
+        if self._pattern is None:
+            return response_text
+
+        links = self._links
+        return self._pattern.sub(
+            lambda match: links.get(match.group(1).lower(), match.group(0)),
+            response_text
+        )
+
+
+form_link_index = FormLinkIndex(forms_collection)
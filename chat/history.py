@@ -1,10 +1,14 @@
 from datetime import datetime, time, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from typing import Optional
+from pymongo import DESCENDING
 from bson import ObjectId
-from auth.jwt_handler import decode_access_token
-from fastapi.security import OAuth2PasswordBearer
+from auth.dependencies import Principal, require_user
 import pytz
 from db import MongoDB
+from chat.message_store import message_store
+from chat.pagination import encode_cursor, keyset_filter
+from responses import MongoJSONResponse
 
 START_TIME = time(0, 0, 0)  # 12:00:00 AM
 END_TIME = time(23, 59, 59)  # 11:59:59 PM
@@ -12,8 +16,6 @@ END_TIME = time(23, 59, 59)  # 11:59:59 PM
 # Define IST timezone
 IST = pytz.timezone('Asia/Kolkata')
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-
 # Initialize router
 chat_router = APIRouter()
 
@@ -22,28 +24,60 @@ users_collection = db["users"]
 conversation_collection = db["conversations"]
 faq_collection = db["FAQs"]
 
+MAX_PAGE_SIZE = 100
+
+# Fields returned by the paginated conversation listing
+CONVERSATION_LIST_PROJECTION = {"title": 1, "language": 1, "created_at": 1, "updated_at": 1}
+
+
+async def list_conversations(user_id: str, limit: int, cursor: Optional[str]):
+    query = {"user_id": ObjectId(user_id)}
+    query.update(keyset_filter("updated_at", cursor))
+    conversations = await conversation_collection.find(
+        query, CONVERSATION_LIST_PROJECTION
+    ).sort([("updated_at", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1).to_list(limit + 1)
+
+    has_more = len(conversations) > limit
+    conversations = conversations[:limit]
+
+    for convo in conversations:
+        if "title" not in convo:
+            # Conversations created before titles were stored: derive once and persist
+            full_convo = await conversation_collection.find_one({"_id": convo["_id"]}, {"messages": {"$slice": 1}})
+            convo["title"] = await message_store.first_question(full_convo) or "Untitled"
+            await conversation_collection.update_one(
+                {"_id": convo["_id"], "title": {"$exists": False}},
+                {"$set": {"title": convo["title"]}}
+            )
+
+    next_cursor = None
+    if has_more and conversations:
+        last = conversations[-1]
+        next_cursor = encode_cursor(last["updated_at"], last["_id"])
+    return conversations, next_cursor
+
+
 @chat_router.get("/chat/history") 
 async def get_chat_history(
-    token: str = Depends(oauth2_scheme),
+    principal: Principal = Depends(require_user),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; enables the paginated listing"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
 ):
-    # Decode the access token to get user information
-    user = decode_access_token(token)
-    
-    if "error" in user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Unauthorized access."
-        )
-    
-    user_id = user.get("user_id")
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User ID not found in token."
-        )
+    user_id = principal.user_id
     
+    if limit is not None:
+        # Listing mode: titles and timestamps only, newest first; messages load per conversation
+        conversations, next_cursor = await list_conversations(user_id, limit, cursor)
+        return MongoJSONResponse({
+            "status": "success",
+            "message": "Chat history retrieved successfully." if conversations else "No chat history found.",
+            "data": conversations,
+            "next_cursor": next_cursor
+        })
+
     # Fetch conversations for the user
     conversations = await conversation_collection.find({"user_id": ObjectId(user_id)}).to_list(None)
+    await message_store.attach_messages(conversations)
     
     if not conversations:
         return {
@@ -52,32 +86,26 @@ async def get_chat_history(
             "data": []
         }
     
-    # Convert ObjectId to string for JSON serialization and add "title"
-    def convert_objectid_fields(obj):
-        """ Recursively converts ObjectId fields to strings in dictionaries and lists. """
-        if isinstance(obj, dict):
-            return {k: str(v) if isinstance(v, ObjectId) else convert_objectid_fields(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_objectid_fields(item) for item in obj]
-        else:
-            return obj
-
-    conversations = [convert_objectid_fields(convo) for convo in conversations]
-
-    # Set "title" as the first question in messages, if available
+    # Prefer the stored title, else the first question in messages, if available
     for convo in conversations:
-        convo["title"] = convo["messages"][0]["question"] if convo.get("messages") else "Untitled"
+        if not convo.get("title"):
+            convo["title"] = convo["messages"][0]["question"] if convo.get("messages") else "Untitled"
 
-    return {
+    # ObjectIds and datetimes are encoded by the response itself
+    return MongoJSONResponse({
         "status": "success",
         "message": "Chat history retrieved successfully.",
         "data": conversations
-    }
+    })
 
 
 
 @chat_router.get("/chat/history/{conversation_id}")
-async def get_specific_chat_history(conversation_id: str):
+async def get_specific_chat_history(
+    conversation_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; returns the newest messages first"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page, for older messages"),
+):
     try:
         conversation_obj_id = ObjectId(conversation_id)
     except Exception:
@@ -94,21 +122,20 @@ async def get_specific_chat_history(conversation_id: str):
             detail="Conversation not found."
         )
 
-    def convert_objectid_fields(doc):
-        if isinstance(doc, dict):
-            return {k: str(v) if isinstance(v, ObjectId) else convert_objectid_fields(v) for k, v in doc.items()}
-        elif isinstance(doc, list):
-            return [convert_objectid_fields(i) for i in doc]
-        else:
-            return doc
-
-    conversation = convert_objectid_fields(conversation)
+    next_cursor = None
+    if limit is not None:
+        conversation["messages"], next_cursor = await message_store.page_for_conversation(conversation, limit, cursor)
+    else:
+        await message_store.attach_messages([conversation])
 
-    return {
+    response = {
         "status": "success",
         "message": "Chat history retrieved successfully.",
         "data": conversation
     }
+    if limit is not None:
+        response["next_cursor"] = next_cursor
+    return MongoJSONResponse(response)
 
 
 @chat_router.get("/faqs/history/")
@@ -124,12 +151,8 @@ async def get_chat_history():
             "data": []
         }
     
-    # Convert ObjectId to string for JSON serialization and add "title"
-    for convo in conversations:
-        convo["_id"] = str(convo["_id"])
-
-    return {
+    return MongoJSONResponse({
         "status": "success",
         "message": "FAQs history retrieved successfully.",
         "data": conversations
-    }
+    })
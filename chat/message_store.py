@@ -0,0 +1,195 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from chat.pagination import decode_cursor, encode_cursor, keyset_filter
+from db import MongoDB
+
+db = MongoDB.get_db()
+messages_collection = db["messages"]
+conversation_collection = db["conversations"]
+
+
+class MessageStore:
+    """
+    Messages live in their own collection, one document per message, indexed
+    on (conversation_id, timestamp). Conversations created before the move
+    still carry an embedded `messages` array until `chat.migrate_messages`
+    has run, so every read and update falls back to the embedded copy when
+    the message is not found in the messages collection.
+    """
+
+    def __init__(self, collection, conversation_collection):
+        self._collection = collection
+        self._conversation_collection = conversation_collection
+
+    async def insert(self, conversation_id, message: dict):
+        message = dict(message, conversation_id=ObjectId(conversation_id))
+        await self._collection.insert_one(message)
+
+    async def find(self, message_id: ObjectId, user_id: Optional[str] = None) -> Optional[dict]:
+        """
+        Returns the message, or None if it does not exist or, when `user_id`
+        is given and not "guest", belongs to another user.
+        """
+        message = await self._collection.find_one({"_id": message_id})
+        if message is None:
+            # Compatibility read path for conversations not migrated yet
+            conversation = await self._conversation_collection.find_one(
+                {"messages._id": message_id},
+                {"messages.$": 1}
+            )
+            if not conversation or not conversation.get("messages"):
+                return None
+            message = dict(conversation["messages"][0], conversation_id=conversation["_id"])
+
+        if user_id and user_id != "guest" and str(message.get("user_id")) != user_id:
+            return None
+        return message
+
+    async def update_fields(self, message_id: ObjectId, set_fields: dict, inc_fields: Optional[dict] = None) -> bool:
+        """Applies `$set` (and optionally `$inc`) to the message. Returns False if it does not exist."""
+        update = {"$set": set_fields}
+        if inc_fields:
+            update["$inc"] = inc_fields
+
+        result = await self._collection.update_one({"_id": message_id}, update)
+        if result.matched_count:
+            return True
+
+        # Compatibility write path for conversations not migrated yet
+        legacy_update = {"$set": {f"messages.$.{field}": value for field, value in set_fields.items()}}
+        if inc_fields:
+            legacy_update["$inc"] = {f"messages.$.{field}": value for field, value in inc_fields.items()}
+        result = await self._conversation_collection.update_one({"messages._id": message_id}, legacy_update)
+        return result.matched_count > 0
+
+    async def increment_counters(self, message_id: ObjectId, inc_fields: dict) -> Optional[dict]:
+        """
+        Applies `$inc` in a single write and returns the incremented fields'
+        new values, or None if the message does not exist.
+        """
+        message = await self._collection.find_one_and_update(
+            {"_id": message_id},
+            {"$inc": inc_fields},
+            projection={field: 1 for field in inc_fields},
+            return_document=ReturnDocument.AFTER
+        )
+        if message is not None:
+            return message
+
+        # Compatibility write path for conversations not migrated yet
+        conversation = await self._conversation_collection.find_one_and_update(
+            {"messages._id": message_id},
+            {"$inc": {f"messages.$.{field}": value for field, value in inc_fields.items()}},
+            projection={"messages.$": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not conversation or not conversation.get("messages"):
+            return None
+        return conversation["messages"][0]
+
+    async def find_many(self, message_ids: Iterable[ObjectId], fields: Iterable[str]) -> Dict[ObjectId, dict]:
+        """Returns {message_id: message with only `fields`} for the messages that exist."""
+        message_ids = list(message_ids)
+        projection = {field: 1 for field in fields}
+        found = {}
+        async for message in self._collection.find({"_id": {"$in": message_ids}}, projection):
+            found[message["_id"]] = message
+
+        missing = [message_id for message_id in message_ids if message_id not in found]
+        if missing:
+            # Compatibility read path for conversations not migrated yet
+            embedded_projection = {"messages._id": 1}
+            embedded_projection.update({f"messages.{field}": 1 for field in projection})
+            missing_ids = set(missing)
+            async for conversation in self._conversation_collection.find({"messages._id": {"$in": missing}}, embedded_projection):
+                for message in conversation.get("messages") or []:
+                    if message.get("_id") in missing_ids:
+                        found[message["_id"]] = message
+        return found
+
+    async def attach_messages(self, conversations: List[dict]) -> List[dict]:
+        """
+        Sets each conversation's `messages` to all of its messages, oldest
+        first, merging any still embedded in it. Uses one query for all
+        conversations.
+        """
+        if not conversations:
+            return conversations
+
+        stored = {conversation["_id"]: [] for conversation in conversations}
+        cursor = self._collection.find(
+            {"conversation_id": {"$in": list(stored)}}
+        ).sort([("conversation_id", ASCENDING), ("timestamp", ASCENDING)])
+        async for message in cursor:
+            stored[message["conversation_id"]].append(message)
+
+        for conversation in conversations:
+            messages = stored[conversation["_id"]]
+            embedded = conversation.get("messages")
+            if embedded:
+                # While the migration runs a message may exist in both places; the collection copy is current
+                stored_ids = {message["_id"] for message in messages}
+                messages.extend(message for message in embedded if message["_id"] not in stored_ids)
+                messages.sort(key=lambda message: message.get("timestamp") or datetime.min)
+            conversation["messages"] = messages
+        return conversations
+
+    async def page_for_conversation(self, conversation: dict, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Returns up to `limit` messages older than `cursor` (newest page first
+        when no cursor), ordered oldest first, and the cursor for the next
+        older page or None.
+        """
+        if conversation.get("messages"):
+            # Conversations not migrated yet are paged in memory
+            messages = (await self.attach_messages([conversation]))[0]["messages"]
+            if cursor:
+                before_time, before_id = decode_cursor(cursor)
+                messages = [
+                    message for message in messages
+                    if (message["timestamp"], message["_id"]) < (before_time, before_id)
+                ]
+            page = messages[-limit:]
+            has_more = len(messages) > limit
+        else:
+            query = {"conversation_id": conversation["_id"]}
+            query.update(keyset_filter("timestamp", cursor))
+            page = await self._collection.find(query).sort(
+                [("timestamp", DESCENDING), ("_id", DESCENDING)]
+            ).limit(limit + 1).to_list(limit + 1)
+            has_more = len(page) > limit
+            page = list(reversed(page[:limit]))
+
+        next_cursor = encode_cursor(page[0]["timestamp"], page[0]["_id"]) if has_more and page else None
+        return page, next_cursor
+
+    async def first_question(self, conversation: dict) -> Optional[str]:
+        if conversation.get("messages"):
+            return conversation["messages"][0].get("question")
+        message = await self._collection.find_one(
+            {"conversation_id": conversation["_id"]},
+            {"question": 1},
+            sort=[("timestamp", ASCENDING)]
+        )
+        return message.get("question") if message else None
+
+    async def delete_for_conversation(self, conversation_id: ObjectId):
+        await self._collection.delete_many({"conversation_id": conversation_id})
+
+    async def touch_conversation(self, conversation_id, title: Optional[str] = None):
+        """Bumps updated_at and, for the first message, stores the conversation title."""
+        fields = {"updated_at": datetime.utcnow()}
+        if title:
+            # $literal so a question starting with "$" is not read as a field path
+            fields["title"] = {"$ifNull": ["$title", {"$literal": title}]}
+        await self._conversation_collection.update_one(
+            {"_id": ObjectId(conversation_id)},
+            [{"$set": fields}]
+        )
+
+
+message_store = MessageStore(messages_collection, conversation_collection)
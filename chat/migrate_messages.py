@@ -0,0 +1,108 @@
+"""
+Online migration of embedded `conversations.messages` arrays into the
+`messages` collection.
+
+    python -m chat.migrate_messages [--batch-size 100] [--prune] [--dry-run]
+
+Safe to run while the API is serving traffic and safe to re-run: messages
+are upserted by _id without overwriting documents already in the messages
+collection, and `--prune` only pulls the embedded copies it has migrated,
+and only if the embedded array is unchanged since it was last synced.
+"""
+import argparse
+import asyncio
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+load_dotenv()
+
+from chat.message_store import conversation_collection, messages_collection
+from db import MongoDB
+from indexes import INDEXES, create_collection_indexes
+
+# Sync-and-prune rounds per conversation before giving up on pruning it for this run
+MAX_PRUNE_ATTEMPTS = 5
+
+
+def copy_operations(conversation: dict):
+    operations = []
+    for message in conversation.get("messages") or []:
+        document = dict(message, conversation_id=conversation["_id"])
+        document.pop("_id")
+        operations.append(UpdateOne({"_id": message["_id"]}, {"$setOnInsert": document}, upsert=True))
+    return operations
+
+
+async def migrate_conversation(conversation: dict, prune: bool) -> int:
+    embedded = conversation.get("messages") or []
+    if not embedded:
+        return 0
+
+    await messages_collection.bulk_write(copy_operations(conversation), ordered=False)
+
+    # Embedded state already reflected in the messages collection
+    synced = {message["_id"]: message for message in embedded}
+    for _ in range(MAX_PRUNE_ATTEMPTS):
+        # Updates that landed on the embedded copy between our read and the copy
+        # are re-applied; after the copy, writes go to the messages collection.
+        reread = await conversation_collection.find_one({"_id": conversation["_id"]}, {"messages": 1})
+        current = (reread or {}).get("messages") or []
+        refresh_operations = []
+        for message in current:
+            before = synced.get(message["_id"])
+            if before is not None and before != message:
+                changed = {field: value for field, value in message.items() if before.get(field) != value}
+                refresh_operations.append(UpdateOne({"_id": message["_id"]}, {"$set": changed}))
+                synced[message["_id"]] = message
+        if refresh_operations:
+            await messages_collection.bulk_write(refresh_operations, ordered=False)
+
+        if not prune or not current:
+            return len(embedded)
+
+        # A legacy write that commits after the reread changes the array, so
+        # the prune matches nothing and the write is synced on the next round
+        result = await conversation_collection.update_one(
+            {"_id": conversation["_id"], "messages": current},
+            {"$pull": {"messages": {"_id": {"$in": list(synced)}}}}
+        )
+        if result.matched_count:
+            return len(embedded)
+
+    print(f"Conversation {conversation['_id']} kept changing; left unpruned, re-run to prune it")
+    return len(embedded)
+
+
+async def migrate(batch_size: int, prune: bool, dry_run: bool):
+    await create_collection_indexes(MongoDB.get_db(), "messages", INDEXES["messages"])
+
+    query = {"messages.0": {"$exists": True}}
+    total_conversations = await conversation_collection.count_documents(query)
+    print(f"{total_conversations} conversations with embedded messages")
+    if dry_run:
+        return
+
+    migrated_conversations = 0
+    migrated_messages = 0
+    cursor = conversation_collection.find(query, {"messages": 1}).batch_size(batch_size)
+    async for conversation in cursor:
+        migrated_messages += await migrate_conversation(conversation, prune)
+        migrated_conversations += 1
+        if migrated_conversations % batch_size == 0:
+            print(f"Migrated {migrated_conversations}/{total_conversations} conversations ({migrated_messages} messages)")
+
+    print(f"Done: {migrated_conversations} conversations, {migrated_messages} messages")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move embedded conversation messages into the messages collection.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--prune", action="store_true", help="Remove migrated messages from conversations")
+    parser.add_argument("--dry-run", action="store_true", help="Only count conversations to migrate")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.prune, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
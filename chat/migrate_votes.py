@@ -0,0 +1,119 @@
+"""
+Backfill of the `votes` collection from the `vote`/`feedback` fields that
+messages carried before votes were stored per user.
+
+    python -m chat.migrate_votes [--batch-size 500] [--dry-run]
+
+A legacy vote is attributed to the owner of the message's conversation;
+votes on guest conversations cannot be attributed and are skipped. Run it
+right after deploying per-user votes. It is safe to re-run: a user's vote
+is only inserted if they have none yet, so newer votes are never replaced.
+Like/dislike counters already include legacy votes and are not touched.
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+load_dotenv()
+
+from chat.message_store import conversation_collection, messages_collection
+from chat.vote import VOTE_COUNTERS, votes_collection
+from db import MongoDB
+from indexes import INDEXES, create_collection_indexes
+
+LEGACY_VOTE_QUERY = {"$in": list(VOTE_COUNTERS)}
+
+
+def vote_operation(message: dict, owner) -> Optional[UpdateOne]:
+    if not isinstance(owner, ObjectId):
+        # Guest conversation
+        return None
+    voted_at = message.get("timestamp") or datetime.utcnow()
+    return UpdateOne(
+        {"message_id": message["_id"], "user_id": owner},
+        {"$setOnInsert": {
+            "vote": message["vote"],
+            "feedback": message.get("feedback"),
+            "created_at": voted_at,
+            "updated_at": voted_at
+        }},
+        upsert=True
+    )
+
+
+class OwnerLookup:
+    def __init__(self):
+        self._owners: Dict[ObjectId, object] = {}
+
+    async def get(self, conversation_id):
+        if conversation_id not in self._owners:
+            conversation = await conversation_collection.find_one({"_id": conversation_id}, {"user_id": 1})
+            self._owners[conversation_id] = (conversation or {}).get("user_id")
+        return self._owners[conversation_id]
+
+
+async def flush(operations: List[UpdateOne]) -> int:
+    if not operations:
+        return 0
+    result = await votes_collection.bulk_write(operations, ordered=False)
+    operations.clear()
+    return result.upserted_count
+
+
+async def backfill(batch_size: int, dry_run: bool):
+    await create_collection_indexes(MongoDB.get_db(), "votes", INDEXES["votes"])
+
+    message_query = {"vote": LEGACY_VOTE_QUERY}
+    conversation_query = {"messages.vote": LEGACY_VOTE_QUERY}
+    print(f"{await messages_collection.count_documents(message_query)} messages with a legacy vote")
+    print(f"{await conversation_collection.count_documents(conversation_query)} unmigrated conversations with legacy votes")
+    if dry_run:
+        return
+
+    owners = OwnerLookup()
+    operations: List[UpdateOne] = []
+    inserted = skipped = 0
+
+    cursor = messages_collection.find(message_query, {"vote": 1, "feedback": 1, "timestamp": 1, "conversation_id": 1})
+    async for message in cursor.batch_size(batch_size):
+        operation = vote_operation(message, await owners.get(message.get("conversation_id")))
+        if operation is None:
+            skipped += 1
+            continue
+        operations.append(operation)
+        if len(operations) >= batch_size:
+            inserted += await flush(operations)
+
+    # Messages still embedded in conversations (chat.migrate_messages not run yet)
+    cursor = conversation_collection.find(conversation_query, {"user_id": 1, "messages": 1})
+    async for conversation in cursor.batch_size(batch_size):
+        for message in conversation.get("messages") or []:
+            if message.get("vote") not in VOTE_COUNTERS:
+                continue
+            operation = vote_operation(message, conversation.get("user_id"))
+            if operation is None:
+                skipped += 1
+                continue
+            operations.append(operation)
+        if len(operations) >= batch_size:
+            inserted += await flush(operations)
+
+    inserted += await flush(operations)
+    print(f"Done: {inserted} votes inserted, {skipped} guest votes skipped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy legacy per-message votes into the votes collection.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Only count legacy votes")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import asyncio
+import itertools
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from db import MongoDB
+
+db = MongoDB.get_db()
+models_collection = db["Models"]
+
+MODEL_REGISTRY_TTL_SECONDS = float(os.getenv("MODEL_REGISTRY_TTL_SECONDS", "300"))
+
+ModelKey = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class ModelRegistry:
+    """
+    In-memory copy of the Models collection keyed by (model_type, source, target).
+    Any part of the key may be None to act as a wildcard, which mirrors the
+    find_one queries the pipeline used to run (e.g. translation models are
+    looked up by languages only). Like find_one, the first model in natural
+    order wins when several match.
+    """
+
+    def __init__(self, collection, ttl_seconds: float = MODEL_REGISTRY_TTL_SECONDS):
+        self._collection = collection
+        self._ttl_seconds = ttl_seconds
+        self._models: Dict[ModelKey, dict] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at > self._ttl_seconds
+
+    async def reload(self):
+        models_data = await self._collection.find().to_list(length=None)
+
+        models = {}
+        for model in models_data:
+            full_key = (
+                model.get("model_type"),
+                model.get("sourcelanguage"),
+                model.get("targetlanguage"),
+            )
+            # Register the model under every wildcard combination of its key
+            for mask in itertools.product((True, False), repeat=3):
+                key = tuple(part if keep else None for part, keep in zip(full_key, mask))
+                models.setdefault(key, model)
+
+        self._models = models
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def ensure_fresh(self):
+        if not self._is_stale():
+            return
+        async with self._lock:
+            if self._is_stale():
+                await self.reload()
+
+    async def get(
+        self,
+        model_type: Optional[str] = None,
+        source: Optional[str] = None,
+        target: Optional[str] = None
+    ) -> Optional[dict]:
+        await self.ensure_fresh()
+        return self._models.get((model_type, source, target))
+
+
+model_registry = ModelRegistry(models_collection)
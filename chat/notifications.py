@@ -0,0 +1,137 @@
+import asyncio
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+NOTIFICATIONS_QUEUE_SIZE = int(os.getenv("NOTIFICATIONS_QUEUE_SIZE", "100"))
+# Relay events from Mongo change streams so every worker process sees them (needs a replica set)
+NOTIFICATIONS_CHANGE_STREAM = os.getenv("NOTIFICATIONS_CHANGE_STREAM", "false").lower() == "true"
+
+
+def message_topic(message_id) -> str:
+    return f"message:{message_id}"
+
+
+def conversation_topic(conversation_id) -> str:
+    return f"conversation:{conversation_id}"
+
+
+class Subscription:
+    def __init__(self, pubsub: "PubSub", topics: Tuple[str, ...], max_size: int):
+        self._pubsub = pubsub
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Returns the next event, or None if `timeout` elapses first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._pubsub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PubSub:
+    """
+    In-process topic pub/sub. Each subscriber gets its own bounded queue; a
+    subscriber that falls behind drops its oldest events rather than
+    blocking publishers.
+    """
+
+    def __init__(self, max_queue_size: int = NOTIFICATIONS_QUEUE_SIZE):
+        self._max_queue_size = max_queue_size
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, *topics: str) -> Subscription:
+        subscription = Subscription(self, topics, self._max_queue_size)
+        for topic in topics:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[topic]
+
+    def publish(self, topic: str, event: dict):
+        self.published += 1
+        for subscription in list(self._subscribers.get(topic, ())):
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+                self.dropped += 1
+            subscription.queue.put_nowait(event)
+
+    def get_stats(self) -> dict:
+        return {
+            "topics": len(self._subscribers),
+            "subscriptions": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+class ChangeStreamRelay:
+    """
+    Watches a collection's change stream and republishes matching changes on
+    the local PubSub, so events produced by any worker process reach the
+    subscribers connected to this one. `to_events` maps a change document
+    to (topic, event) pairs.
+    """
+
+    def __init__(
+        self,
+        pubsub: PubSub,
+        collection,
+        pipeline: List[dict],
+        to_events: Callable[[dict], Iterable[Tuple[str, dict]]],
+        retry_seconds: float = 5
+    ):
+        self._pubsub = pubsub
+        self._collection = collection
+        self._pipeline = pipeline
+        self._to_events = to_events
+        self._retry_seconds = retry_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        resume_token = None
+        while True:
+            try:
+                async with self._collection.watch(
+                    self._pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        for topic, event in self._to_events(change):
+                            self._pubsub.publish(topic, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Change stream relay error, retrying: {str(e)}")
+                await asyncio.sleep(self._retry_seconds)
+
+
+pubsub = PubSub()
@@ -0,0 +1,33 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+
+def encode_cursor(sort_value: datetime, document_id: ObjectId) -> str:
+    raw = f"{sort_value.isoformat()}|{document_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        sort_value, document_id = raw.split("|", 1)
+        return datetime.fromisoformat(sort_value), ObjectId(document_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+
+
+def keyset_filter(field: str, cursor: Optional[str]) -> dict:
+    """Filter for documents strictly after `cursor` in (field, _id) descending order."""
+    if not cursor:
+        return {}
+    sort_value, document_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {field: {"$lt": sort_value}},
+            {field: sort_value, "_id": {"$lt": document_id}},
+        ]
+    }
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import re
+import unicodedata
+from datetime import datetime
+from typing import Optional
+
+from cache import LRUCache
+from db import MongoDB
+
+db = MongoDB.get_db()
+translation_cache_collection = db["translation_cache"]
+
+TRANSLATION_CACHE_MAX_BYTES = int(os.getenv("TRANSLATION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TRANSLATION_CACHE_PERSIST = os.getenv("TRANSLATION_CACHE_PERSIST", "false").lower() == "true"
+TRANSLATION_CACHE_TTL_SECONDS = int(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+def normalize_text(text: str) -> str:
+    # Same meaning, same key: unify unicode forms and collapse whitespace
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class TranslationCache:
+    """
+    Content-addressed cache in front of the NMT upstream, keyed by
+    (model api_url, sha256 of the normalized input text).
+    The in-memory LRU tier is always on; the Mongo tier is enabled with
+    TRANSLATION_CACHE_PERSIST=true and expires entries through a TTL index
+    on created_at (see indexes.py).
+    """
+
+    def __init__(self, collection, max_bytes: int, persist: bool):
+        self._collection = collection
+        self._memory = LRUCache(max_bytes=max_bytes)
+        self._persist = persist
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+
+    @staticmethod
+    def make_key(api_url: str, input_text: str) -> str:
+        digest = hashlib.sha256(normalize_text(input_text).encode("utf-8")).hexdigest()
+        return f"{api_url}:{digest}"
+
+    async def get(self, api_url: str, input_text: str) -> Optional[str]:
+        key = self.make_key(api_url, input_text)
+        output_text = self._memory.get(key)
+        if output_text is not None or not self._persist:
+            return output_text
+
+        try:
+            document = await self._collection.find_one({"_id": key}, {"output_text": 1})
+        except Exception as e:
+            print(f"Translation cache lookup failed: {str(e)}")
+            return None
+
+        if not document:
+            self.persistent_misses += 1
+            return None
+
+        self.persistent_hits += 1
+        self._memory.set(key, document["output_text"])
+        return document["output_text"]
+
+    async def set(self, api_url: str, input_text: str, output_text: str):
+        if not output_text:
+            return
+        key = self.make_key(api_url, input_text)
+        self._memory.set(key, output_text)
+
+        if not self._persist:
+            return
+        try:
+            await self._collection.update_one(
+                {"_id": key},
+                {"$set": {"output_text": output_text, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            # The cache is best-effort; a failed write must not fail the request
+            print(f"Translation cache write failed: {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {
+            "memory": self._memory.get_stats(),
+            "persistent": {
+                "enabled": self._persist,
+                "hits": self.persistent_hits,
+                "misses": self.persistent_misses,
+            },
+        }
+
+
+translation_cache = TranslationCache(
+    translation_cache_collection,
+    max_bytes=TRANSLATION_CACHE_MAX_BYTES,
+    persist=TRANSLATION_CACHE_PERSIST
+)
@@ -0,0 +1,82 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Optional
+
+from cache import LRUCache
+from db import MongoDB
+
+db = MongoDB.get_db()
+tts_cache_collection = db["tts_cache"]
+
+TTS_CACHE_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MAX_ENTRIES", "10000"))
+
+
+class TTSCache:
+    """
+    Deduplicates TTS synthesis by mapping sha256(clean_text, language, gender)
+    to the s3_url returned by the upstream. Entries are persisted in the
+    tts_cache collection so they survive restarts, with a small LRU in front
+    to skip the Mongo round trip for hot answers.
+    """
+
+    def __init__(self, collection, max_entries: int):
+        self._collection = collection
+        self._memory = LRUCache(max_entries=max_entries)
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+
+    @staticmethod
+    def make_key(clean_text: str, language: str, gender: str) -> str:
+        raw_key = "\x1f".join((language.lower(), gender.lower(), clean_text))
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    async def get(self, clean_text: str, language: str, gender: str = "male") -> Optional[str]:
+        key = self.make_key(clean_text, language, gender)
+        s3_url = self._memory.get(key)
+        if s3_url is not None:
+            return s3_url
+
+        try:
+            document = await self._collection.find_one({"_id": key}, {"s3_url": 1})
+        except Exception as e:
+            print(f"TTS cache lookup failed: {str(e)}")
+            return None
+
+        if not document:
+            self.persistent_misses += 1
+            return None
+
+        self.persistent_hits += 1
+        self._memory.set(key, document["s3_url"])
+        return document["s3_url"]
+
+    async def set(self, clean_text: str, language: str, gender: str, s3_url: str):
+        if not s3_url:
+            return
+        key = self.make_key(clean_text, language, gender)
+        self._memory.set(key, s3_url)
+        try:
+            await self._collection.update_one(
+                {"_id": key},
+                {
+                    "$set": {"s3_url": s3_url, "updated_at": datetime.utcnow()},
+                    "$setOnInsert": {"language": language, "gender": gender, "created_at": datetime.utcnow()}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            # Best-effort: the audio is already synthesized, don't fail the message
+            print(f"TTS cache write failed: {str(e)}")
+
+    def get_stats(self) -> dict:
+        return {
+            "memory": self._memory.get_stats(),
+            "persistent": {
+                "hits": self.persistent_hits,
+                "misses": self.persistent_misses,
+            },
+        }
+
+
+tts_cache = TTSCache(tts_cache_collection, max_entries=TTS_CACHE_MAX_ENTRIES)
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, WebSocket, WebSocketDisconnect
+
+from auth.dependencies import Principal, get_principal, principal_from_token
+from chat.ask import TTS_STATE_FIELDS
+from chat.message_store import message_store
+from chat.notifications import conversation_topic, message_topic, pubsub
+from db import MongoDB
+
+tts_events_router = APIRouter()
+
+db = MongoDB.get_db()
+conversation_collection = db["conversations"]
+
+LONG_POLL_MAX_SECONDS = 30
+# Without an event for this long the message WebSocket re-reads the stored state
+WEBSOCKET_REFRESH_SECONDS = 15
+
+
+async def find_message_tts_state(message_obj_id: ObjectId, user_id: str) -> Optional[dict]:
+    # Same visibility rules as GET /message/{message_id}
+    message = await message_store.find(message_obj_id, user_id)
+    if not message:
+        return None
+
+    return {
+        "tts_status": message.get("tts_status", "unknown"),
+        "tts_url": message.get("tts_url"),
+        "tts_summary_status": message.get("tts_summary_status", "unknown"),
+        "tts_summary_url": message.get("tts_summary_url")
+    }
+
+
+def is_settled(tts_state: dict) -> bool:
+    return "processing" not in (tts_state["tts_status"], tts_state["tts_summary_status"])
+
+
+def parse_object_id(value: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
+
+
+@tts_events_router.get("/message/{message_id}/wait")
+async def wait_for_message_tts(
+    message_id: str = Path(...),
+    timeout: float = Query(25, ge=0, le=LONG_POLL_MAX_SECONDS, description="Seconds to wait for TTS to settle"),
+    principal: Principal = Depends(get_principal)
+):
+    """Long-poll alternative to polling /message/{message_id}: returns once TTS settles or on timeout."""
+    message_obj_id = parse_object_id(message_id)
+    if message_obj_id is None:
+        raise HTTPException(status_code=400, detail="Invalid message ID format")
+
+    user_id = principal.user_id
+
+    # Subscribe before reading so a completion in between is not missed
+    with pubsub.subscribe(message_topic(message_id)) as subscription:
+        tts_state = await find_message_tts_state(message_obj_id, user_id)
+        if tts_state is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Message not found or you don't have permission to access it"
+            )
+
+        deadline = time.monotonic() + timeout
+        while not is_settled(tts_state):
+            event = await subscription.get(timeout=max(0, deadline - time.monotonic()))
+            if event is None:
+                break
+            tts_state.update({field: event[field] for field in TTS_STATE_FIELDS if field in event})
+
+    return {
+        "status": "success",
+        "data": tts_state
+    }
+
+
+@tts_events_router.websocket("/ws/message/{message_id}")
+async def message_tts_websocket(websocket: WebSocket, message_id: str, token: Optional[str] = None):
+    """Sends the current TTS state, then every update until both audios have settled."""
+    await websocket.accept()
+    message_obj_id = parse_object_id(message_id)
+    if message_obj_id is None:
+        await websocket.close(code=1008, reason="Invalid message ID format")
+        return
+
+    # Browsers cannot set headers on WebSockets, so the token comes as a query parameter
+    user_id = principal_from_token(token).user_id
+
+    with pubsub.subscribe(message_topic(message_id)) as subscription:
+        tts_state = await find_message_tts_state(message_obj_id, user_id)
+        if tts_state is None:
+            await websocket.close(code=1008, reason="Message not found")
+            return
+
+        try:
+            await websocket.send_json({"event": "tts", "message_id": message_id, **tts_state})
+            while not is_settled(tts_state):
+                event = await subscription.get(timeout=WEBSOCKET_REFRESH_SECONDS)
+                if event is None:
+                    # Covers jobs settled by other worker processes
+                    stored_state = await find_message_tts_state(message_obj_id, user_id)
+                    if stored_state is None or stored_state == tts_state:
+                        continue
+                    tts_state = stored_state
+                else:
+                    tts_state.update({field: event[field] for field in TTS_STATE_FIELDS if field in event})
+                await websocket.send_json({"event": "tts", "message_id": message_id, **tts_state})
+        except WebSocketDisconnect:
+            return
+
+    await websocket.close()
+
+
+@tts_events_router.websocket("/ws/conversation/{conversation_id}")
+async def conversation_tts_websocket(websocket: WebSocket, conversation_id: str, token: Optional[str] = None):
+    """Streams TTS updates for every message of a conversation until the client disconnects."""
+    await websocket.accept()
+    conversation_obj_id = parse_object_id(conversation_id)
+    if conversation_obj_id is None:
+        await websocket.close(code=1008, reason="Invalid conversation ID format")
+        return
+
+    user_id = principal_from_token(token).user_id
+    conversation = await conversation_collection.find_one({"_id": conversation_obj_id}, {"user_id": 1})
+    if not conversation or (user_id != "guest" and str(conversation.get("user_id")) != user_id):
+        await websocket.close(code=1008, reason="Conversation not found")
+        return
+
+    with pubsub.subscribe(conversation_topic(conversation_id)) as subscription:
+        receive_task = asyncio.ensure_future(websocket.receive())
+        try:
+            while True:
+                event_task = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait({receive_task, event_task}, return_when=asyncio.FIRST_COMPLETED)
+                if event_task in done:
+                    await websocket.send_json(event_task.result())
+                else:
+                    event_task.cancel()
+
+                if receive_task in done:
+                    if receive_task.result()["type"] == "websocket.disconnect":
+                        return
+                    # Client messages are ignored; keep listening for disconnects
+                    receive_task = asyncio.ensure_future(websocket.receive())
+        except WebSocketDisconnect:
+            return
+        finally:
+            receive_task.cancel()
@@ -0,0 +1,317 @@
+"""
+Mongo-backed TTS job queue. Every API process runs TTS_WORKER_CONCURRENCY
+workers by default. To scale synthesis separately, run the workers in their
+own processes:
+
+    python -m chat.tts_queue [--concurrency 8]
+
+and start the API nodes with TTS_WORKER_CONCURRENCY=0, so they only enqueue.
+A worker process only stops leasing on SIGINT/SIGTERM, then waits up to
+TTS_QUEUE_DRAIN_SECONDS for its jobs. Its completions are not published on
+the API nodes' in-process notifications, so set NOTIFICATIONS_CHANGE_STREAM=true
+on the API nodes for SSE clients to receive them.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ASCENDING, ReturnDocument
+
+load_dotenv()
+
+TTS_WORKER_CONCURRENCY = int(os.getenv("TTS_WORKER_CONCURRENCY", "4"))
+TTS_JOB_VISIBILITY_TIMEOUT = float(os.getenv("TTS_JOB_VISIBILITY_TIMEOUT", "120"))
+TTS_JOB_MAX_ATTEMPTS = int(os.getenv("TTS_JOB_MAX_ATTEMPTS", "3"))
+TTS_JOB_BACKOFF_SECONDS = float(os.getenv("TTS_JOB_BACKOFF_SECONDS", "5"))
+TTS_QUEUE_POLL_INTERVAL = float(os.getenv("TTS_QUEUE_POLL_INTERVAL", "1"))
+TTS_QUEUE_DRAIN_SECONDS = float(os.getenv("TTS_QUEUE_DRAIN_SECONDS", "30"))
+# Done and failed jobs are removed this long after settling (TTL index in indexes.py)
+TTS_JOB_RETENTION_SECONDS = int(os.getenv("TTS_JOB_RETENTION_SECONDS", str(24 * 3600)))
+
+# Statuses of jobs that are still to be processed
+LIVE_STATUSES = ("queued", "leased")
+
+# Lower value is leased first, so summaries are synthesized before full answers
+PRIORITY_SUMMARY = 0
+PRIORITY_FULL = 1
+
+# Message fields updated for each job target
+TARGET_FIELDS = {
+    "summary": ("tts_summary_url", "tts_summary_status"),
+    "full": ("tts_url", "tts_status"),
+}
+
+
+def settled_tts_fields(targets: List[str], s3_url: Optional[str], tts_status: str) -> dict:
+    """Message fields a settled job sets."""
+    fields = {}
+    for target in targets:
+        url_field, status_field = TARGET_FIELDS[target]
+        if s3_url is not None:
+            fields[url_field] = s3_url
+        fields[status_field] = tts_status
+    return fields
+
+
+class TTSJobQueue:
+    """
+    Mongo-backed TTS job queue with an in-process async worker pool.
+
+    Each job synthesizes one text and writes the result to the message's
+    `tts_*` fields for its targets ("summary", "full" or both
+    when the texts are identical). Jobs are leased with a visibility timeout,
+    so a job held by a crashed worker becomes available again. Failures are
+    retried with exponential backoff up to `max_attempts`, after which the
+    targets are marked "failed". `on_settled(job, s3_url, tts_status)` is
+    called after a job's message fields have been written.
+    """
+
+    def __init__(
+        self,
+        collection,
+        message_store,
+        synthesize: Callable[[str, str], Awaitable[str]],
+        on_settled: Optional[Callable[[dict, Optional[str], str], None]] = None,
+        concurrency: int = TTS_WORKER_CONCURRENCY,
+        visibility_timeout: float = TTS_JOB_VISIBILITY_TIMEOUT,
+        max_attempts: int = TTS_JOB_MAX_ATTEMPTS,
+        backoff_seconds: float = TTS_JOB_BACKOFF_SECONDS,
+        poll_interval: float = TTS_QUEUE_POLL_INTERVAL
+    ):
+        self._collection = collection
+        self._message_store = message_store
+        self._synthesize = synthesize
+        self._on_settled = on_settled
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_interval = poll_interval
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def enqueue(self, conversation_id, message_id: ObjectId, language: str, text: str, targets: List[str]):
+        now = datetime.utcnow()
+        await self._collection.insert_one({
+            "conversation_id": ObjectId(conversation_id),
+            "message_id": message_id,
+            "language": language,
+            "text": text,
+            "targets": targets,
+            "priority": PRIORITY_SUMMARY if "summary" in targets else PRIORITY_FULL,
+            "status": "queued",
+            "attempts": 0,
+            "available_at": now,
+            "lease_expires_at": None,
+            "lease_token": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.ensure_future(self._run_worker(index))
+            for index in range(self.concurrency)
+        ]
+
+    async def stop(self, drain_timeout: float = TTS_QUEUE_DRAIN_SECONDS):
+        """Stops leasing new jobs and waits for in-progress jobs to finish."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if not self._workers:
+            return
+
+        done, pending = await asyncio.wait(self._workers, timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+
+    async def _run_worker(self, index: int):
+        while not self._stopping:
+            try:
+                job = await self._lease()
+            except Exception as e:
+                print(f"TTS worker {index} failed to lease a job: {str(e)}")
+                job = None
+
+            if job is None:
+                await self._wait_for_work()
+                continue
+
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                # Shutdown deadline passed; hand the job back instead of waiting for its lease to expire
+                await self._release(job)
+                raise
+            except Exception as e:
+                # Keep the worker alive; the lease expires and the job is retried
+                print(f"TTS worker {index} failed on job {job['_id']}: {str(e)}")
+
+    async def _wait_for_work(self):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _lease(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self._collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued", "available_at": {"$lte": now}},
+                    {"status": "leased", "lease_expires_at": {"$lte": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": "leased",
+                    "lease_token": uuid.uuid4().hex,
+                    "lease_expires_at": now + timedelta(seconds=self.visibility_timeout),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("priority", ASCENDING), ("available_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _process(self, job: dict):
+        if job["attempts"] > self.max_attempts:
+            # Lease expired on the last attempt (e.g. the worker crashed)
+            await self._handle_failure(job, RuntimeError("TTS job lease expired"))
+            return
+
+        try:
+            s3_url = await asyncio.wait_for(
+                self._synthesize(job["text"], job["language"]),
+                timeout=self.visibility_timeout
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._handle_failure(job, e)
+            return
+
+        owned = await self._finish(job, {"status": "done", "s3_url": s3_url, "last_error": None, "settled_at": datetime.utcnow()})
+        if owned:
+            self.completed += 1
+            await self._update_message(job, s3_url, "completed")
+
+    async def _handle_failure(self, job: dict, error: Exception):
+        print(f"Error in TTS job {job['_id']} (attempt {job['attempts']}): {str(error)}")
+        if job["attempts"] < self.max_attempts:
+            delay = self.backoff_seconds * (2 ** (job["attempts"] - 1))
+            owned = await self._finish(job, {
+                "status": "queued",
+                "available_at": datetime.utcnow() + timedelta(seconds=delay),
+                "last_error": str(error)
+            })
+            if owned:
+                self.retried += 1
+            return
+
+        owned = await self._finish(job, {"status": "failed", "last_error": str(error), "settled_at": datetime.utcnow()})
+        if owned:
+            self.failed += 1
+            await self._update_message(job, None, "failed")
+
+    async def _finish(self, job: dict, fields: dict) -> bool:
+        # Only the current lease holder may settle the job
+        fields.update({"lease_token": None, "lease_expires_at": None, "updated_at": datetime.utcnow()})
+        result = await self._collection.update_one(
+            {"_id": job["_id"], "status": "leased", "lease_token": job["lease_token"]},
+            {"$set": fields}
+        )
+        return result.modified_count == 1
+
+    async def _release(self, job: dict):
+        now = datetime.utcnow()
+        try:
+            await self._collection.update_one(
+                {"_id": job["_id"], "status": "leased", "lease_token": job["lease_token"]},
+                {
+                    "$set": {
+                        "status": "queued",
+                        "available_at": now,
+                        "lease_token": None,
+                        "lease_expires_at": None,
+                        "updated_at": now
+                    },
+                    # Releasing on shutdown is not a failed attempt
+                    "$inc": {"attempts": -1}
+                }
+            )
+        except Exception as e:
+            print(f"Failed to release TTS job {job['_id']}: {str(e)}")
+
+    async def _update_message(self, job: dict, s3_url: Optional[str], tts_status: str):
+        update_fields = settled_tts_fields(job["targets"], s3_url, tts_status)
+        update_fields["updated_at"] = datetime.utcnow()
+        await self._message_store.update_fields(job["message_id"], update_fields)
+        if self._on_settled is not None:
+            self._on_settled(job, s3_url, tts_status)
+
+    async def get_stats(self) -> dict:
+        # Settled jobs are covered by the counters; live ones are counted through the status index
+        counts = {}
+        for status in LIVE_STATUSES:
+            counts[status] = await self._collection.count_documents({"status": status})
+        return {
+            "workers": len(self._workers),
+            "concurrency": self.concurrency,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "jobs_by_status": counts,
+        }
+
+
+async def run_workers(concurrency: int):
+    # Imported here: chat.ask builds the app's queue and imports this module
+    from chat.ask import tts_queue
+    from http_client import HTTPClient
+
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_requested.set)
+
+    tts_queue.concurrency = concurrency
+    await tts_queue.start()
+    print(f"TTS workers started: {concurrency}")
+    await stop_requested.wait()
+    print("Stopping TTS workers, draining jobs in progress")
+    await tts_queue.stop()
+    await HTTPClient.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run TTS queue workers without the API.")
+    parser.add_argument("--concurrency", type=int, default=TTS_WORKER_CONCURRENCY, help="Jobs processed at once")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1 (TTS_WORKER_CONCURRENCY=0 is meant for API nodes)")
+    asyncio.run(run_workers(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
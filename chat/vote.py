@@ -1,120 +1,157 @@
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Path, BackgroundTasks
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Form, Path, Query
 from bson import ObjectId
-from auth.jwt_handler import decode_access_token
-from fastapi.security import OAuth2PasswordBearer
-import aiohttp
+from auth.dependencies import Principal, get_principal
 from db import MongoDB
-from pydantic import BaseModel
-from typing import Optional, Dict
-import re
-import time
-
-# Initialize router
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)  # Note auto_error=False
-
-async def get_optional_token(token: Optional[str] = Depends(oauth2_scheme)):
-    return token
+from chat.message_store import message_store
+from rate_limit import limit_votes
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from typing import List, Optional
 
 vote_router = APIRouter()
 
 db = MongoDB.get_db()
-users_collection = db["users"]
-conversation_collection = db["conversations"]
-models_collection = db["Models"]
-forms_collection = db["Forms"]
+# One document per (message_id, user_id); unique index in indexes.py
+votes_collection = db["votes"]
 
-@vote_router.post("/message/{message_id}/like")
+MAX_VOTE_COUNT_IDS = 100
+VOTE_COUNTERS = {"liked": "like_count", "disliked": "dislike_count"}
+
+@vote_router.post("/message/{message_id}/like", dependencies=[Depends(limit_votes)])
 async def like_message(
     message_id: str = Path(...),
-    token: Optional[str] = Depends(get_optional_token)
+    principal: Principal = Depends(get_principal)
 ):
     """API to like a message (vote = +1)"""
     return await _handle_vote(
         message_id=message_id,
-        token=token,
+        principal=principal,
         vote_type="liked",
         feedback=None
     )
 
-@vote_router.post("/message/{message_id}/dislike")
+@vote_router.post("/message/{message_id}/dislike", dependencies=[Depends(limit_votes)])
 async def dislike_message(
     feedback: str = Form(..., description="Required remarks for dislike"),
     message_id: str = Path(...),
-    token: Optional[str] = Depends(get_optional_token)
+    principal: Principal = Depends(get_principal)
 ):
     """API to dislike a message (vote = -1) with feedback"""
     return await _handle_vote(
         message_id=message_id,
-        token=token,
+        principal=principal,
         vote_type="disliked",
         feedback=feedback
     )
 
+@vote_router.get("/messages/votes")
+async def get_vote_counts(
+    ids: List[str] = Query(..., description="Message IDs, repeated or comma-separated"),
+    principal: Principal = Depends(get_principal)
+):
+    """Like/dislike counts for many messages, plus the caller's own vote on each when logged in"""
+    try:
+        message_ids = [ObjectId(value) for part in ids for value in part.split(",") if value]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid message ID format")
+    if len(message_ids) > MAX_VOTE_COUNT_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_VOTE_COUNT_IDS} message IDs are allowed")
+
+    messages = await message_store.find_many(message_ids, VOTE_COUNTERS.values())
+
+    user_votes = {}
+    if not principal.is_guest:
+        cursor = votes_collection.find(
+            {"user_id": ObjectId(principal.user_id), "message_id": {"$in": list(messages)}},
+            {"message_id": 1, "vote": 1}
+        )
+        async for vote in cursor:
+            user_votes[vote["message_id"]] = vote["vote"]
+
+    data = {}
+    for message_id, message in messages.items():
+        data[str(message_id)] = {
+            "like_count": message.get("like_count", 0),
+            "dislike_count": message.get("dislike_count", 0),
+            "vote": user_votes.get(message_id)
+        }
+    return {"status": "success", "data": data}
+
+async def get_user_vote(message_id: ObjectId, user_id: str) -> Optional[dict]:
+    if user_id == "guest":
+        return None
+    return await votes_collection.find_one(
+        {"message_id": message_id, "user_id": ObjectId(user_id)},
+        {"vote": 1, "feedback": 1}
+    )
+
+async def _record_vote(message_obj_id: ObjectId, user_obj_id: ObjectId, vote_type: str, feedback: Optional[str], now: datetime) -> Optional[dict]:
+    """
+    Upserts the user's vote unless it already is `vote_type`, and returns the
+    previous vote document (None for a first vote). The unique index turns a
+    repeated vote into a DuplicateKeyError.
+    """
+    return await votes_collection.find_one_and_update(
+        {"message_id": message_obj_id, "user_id": user_obj_id, "vote": {"$ne": vote_type}},
+        {
+            "$set": {"vote": vote_type, "feedback": feedback, "updated_at": now},
+            "$setOnInsert": {"created_at": now}
+        },
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+
 async def _handle_vote(
     message_id: str,
-    token: Optional[str],
+    principal: Principal,
     vote_type: str,  # "liked" or "disliked"
     feedback: Optional[str]
 ):
     # Authentication
-    if not token:
-        raise HTTPException(status_code=401, detail="Login required to vote")
-    
-    user = decode_access_token(token)
-    if "error" in user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
+    if principal.is_guest:
+        detail = "Invalid token" if principal.error else "Login required to vote"
+        raise HTTPException(status_code=401, detail=detail)
+
     # Validate message ID
     try:
         message_obj_id = ObjectId(message_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid message ID format")
-    
-    # Find the conversation with this message
-    conversation = await conversation_collection.find_one(
-        {"messages._id": message_obj_id},
-        {"messages.$": 1}
-    )
-    
-    if not conversation:
+
+    user_obj_id = ObjectId(principal.user_id)
+    already_voted = "Already liked this message" if vote_type == "liked" else "Already disliked this message"
+
+    # Identifies this request's write, so undoing it cannot clobber a newer vote
+    now = datetime.utcnow()
+    try:
+        previous = await _record_vote(message_obj_id, user_obj_id, vote_type, feedback, now)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail=already_voted)
+
+    # Counters change in one write on the message alone: +1 for the new vote, -1 if it replaced the other one
+    inc_fields = {counter: 0 for counter in VOTE_COUNTERS.values()}
+    inc_fields[VOTE_COUNTERS[vote_type]] = 1
+    if previous is not None:
+        inc_fields[VOTE_COUNTERS[previous["vote"]]] = -1
+
+    counts = await message_store.increment_counters(message_obj_id, inc_fields)
+
+    if counts is None:
+        # The message does not exist: undo the vote unless the user has voted again since
+        written = {"vote": vote_type, "updated_at": now}
+        if previous is None:
+            await votes_collection.delete_one(dict(written, message_id=message_obj_id, user_id=user_obj_id))
+        else:
+            await votes_collection.update_one(
+                dict(written, _id=previous["_id"]),
+                {"$set": {"vote": previous["vote"], "feedback": previous.get("feedback"), "updated_at": previous.get("updated_at")}}
+            )
         raise HTTPException(status_code=404, detail="Message not found")
-    
-    message = conversation["messages"][0]
-    current_vote = message.get("vote")
-    
-    # Prepare update operations
-    update_ops = {
-        "$set": {
-            "messages.$.vote": vote_type,
-        }
+
+    return {
+        "status": "success",
+        "vote": vote_type,
+        "like_count": counts.get("like_count", 0),
+        "dislike_count": counts.get("dislike_count", 0)
     }
-    
-    # Handle count changes
-    if vote_type == "liked":
-        if current_vote == "liked":
-            raise HTTPException(status_code=400, detail="Already liked this message")
-        
-        update_ops["$inc"] = {"messages.$.like_count": 1}
-        if current_vote == "disliked":
-            update_ops["$inc"]["messages.$.dislike_count"] = -1
-    
-    else:  # disliked
-        if current_vote == "disliked":
-            raise HTTPException(status_code=400, detail="Already disliked this message")
-        
-        update_ops["$inc"] = {"messages.$.dislike_count": 1}
-        update_ops["$set"]["messages.$.feedback"] = feedback
-        if current_vote == "liked":
-            update_ops["$inc"]["messages.$.like_count"] = -1
-    
-    # Apply updates
-    result = await conversation_collection.update_one(
-        {"messages._id": message_obj_id},
-        update_ops
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=500, detail="Failed to update vote")
-    
-    return {"status": "success", "vote": vote_type}
\ No newline at end of file
@@ -15,7 +15,7 @@ class MongoDB:
     @classmethod
     def get_db(cls) -> Database:
         if cls._db is None:
-            cls._db = cls.get_client()["BHU_Bot"]
+            cls._db = cls.get_client()[os.getenv("MONGO_DB_NAME", "BHU_Bot")]
         return cls._db
 
 # Usage example: 
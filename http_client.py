@@ -0,0 +1,67 @@
+import os
+import aiohttp
+
+
+class HTTPClient:
+    """
+    Application-wide aiohttp session shared by every upstream call
+    (ASR, NMT, TTS and the chatbot), so connections are pooled and kept alive
+    instead of paying a new TCP/TLS handshake per request.
+    """
+    _session: aiohttp.ClientSession = None
+
+    @staticmethod
+    def _build_connector() -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=int(os.getenv("HTTP_POOL_LIMIT", "100")),
+            limit_per_host=int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20")),
+            keepalive_timeout=float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30")),
+            ttl_dns_cache=int(os.getenv("HTTP_DNS_CACHE_TTL", "300")),
+            use_dns_cache=True,
+        )
+
+    @staticmethod
+    def _build_timeout() -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=None,
+            connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            sock_read=float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+        )
+
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        if cls._session is None or cls._session.closed:
+            cls._session = aiohttp.ClientSession(
+                connector=cls._build_connector(),
+                timeout=cls._build_timeout(),
+            )
+        return cls._session
+
+    @classmethod
+    async def close(cls):
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        if cls._session is None or cls._session.closed:
+            return {"open": False}
+
+        connector = cls._session.connector
+        # aiohttp does not expose pool counters publicly, so read them from the connector
+        acquired = getattr(connector, "_acquired", set())
+        acquired_per_host = getattr(connector, "_acquired_per_host", {})
+        idle = getattr(connector, "_conns", {})
+
+        return {
+            "open": True,
+            "limit": connector.limit,
+            "limit_per_host": connector.limit_per_host,
+            "in_use": len(acquired),
+            "in_use_per_host": {
+                f"{key.host}:{key.port}": len(conns)
+                for key, conns in acquired_per_host.items()
+            },
+            "idle": sum(len(conns) for conns in idle.values()),
+        }
@@ -0,0 +1,184 @@
+"""
+Index bootstrap and index-usage verification for every collection.
+
+The app creates the indexes declared in INDEXES at startup. To verify that
+every route's query shape is served by an index (no COLLSCAN), run:
+
+    python -m indexes --check
+"""
+import argparse
+import asyncio
+import os
+import sys
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+load_dotenv()
+
+from db import MongoDB
+from chat.translation_cache import TRANSLATION_CACHE_PERSIST, TRANSLATION_CACHE_TTL_SECONDS
+from rate_limit import RATE_LIMIT_BACKEND
+from mailer import MAIL_OUTBOX_RETENTION_SECONDS
+from chat.tts_queue import TTS_JOB_RETENTION_SECONDS
+
+# OTPs are removed this long after they expire; validated OTPs must survive until /register
+OTP_TTL_GRACE_SECONDS = int(os.getenv("OTP_TTL_GRACE_SECONDS", str(24 * 3600)))
+
+INDEX_OPTIONS_CONFLICT = 85
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "conversations": [
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+        # Compatibility path for messages still embedded in conversations
+        IndexModel([("messages._id", ASCENDING)], sparse=True),
+    ],
+    "messages": [
+        IndexModel([("conversation_id", ASCENDING), ("timestamp", ASCENDING)]),
+    ],
+    "votes": [
+        IndexModel([("message_id", ASCENDING), ("user_id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("message_id", ASCENDING)]),
+    ],
+    "otps": [
+        IndexModel([("email", ASCENDING), ("purpose", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=OTP_TTL_GRACE_SECONDS),
+    ],
+    "Models": [
+        IndexModel([("sourcelanguage", ASCENDING), ("model_type", ASCENDING)]),
+        IndexModel([("sourcelanguage", ASCENDING), ("targetlanguage", ASCENDING)]),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+        # Only sent and failed mail has settled_at
+        IndexModel([("settled_at", ASCENDING)], expireAfterSeconds=MAIL_OUTBOX_RETENTION_SECONDS),
+    ],
+    "tts_jobs": [
+        IndexModel([("status", ASCENDING), ("priority", ASCENDING), ("available_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+        # Only done and failed jobs have settled_at
+        IndexModel([("settled_at", ASCENDING)], expireAfterSeconds=TTS_JOB_RETENTION_SECONDS),
+    ],
+}
+
+if TRANSLATION_CACHE_PERSIST:
+    INDEXES["translation_cache"] = [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=TRANSLATION_CACHE_TTL_SECONDS),
+    ]
+
+if RATE_LIMIT_BACKEND == "mongo":
+    INDEXES["rate_limits"] = [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ]
+
+_sample_id = ObjectId()
+_sample_email = "index-check@example.com"
+
+# (route, collection, filter, sort) for every query the routes run
+QUERY_SHAPES: List[Tuple[str, str, dict, Optional[list]]] = [
+    ("POST /login, /register, /send-otp", "users", {"email": _sample_email}, None),
+    ("POST /forgot-password/send-otp", "users", {"email": _sample_email, "status": "approved"}, None),
+    ("GET /admin/pending_users", "users", {"status": {"$in": ["pending", "rejected"]}}, [("status", ASCENDING)]),
+    ("GET /user/profile", "users", {"_id": _sample_id}, None),
+    ("GET /chat/history", "conversations", {"user_id": _sample_id}, None),
+    ("GET /chat/history?limit=", "conversations", {"user_id": _sample_id}, [("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ("POST /ask/{conversation_id}", "conversations", {"_id": _sample_id}, None),
+    ("GET /message/{message_id} (legacy)", "conversations", {"messages._id": _sample_id}, None),
+    ("GET /message/{message_id}", "messages", {"_id": _sample_id}, None),
+    ("GET /chat/history/{conversation_id}", "messages", {"conversation_id": _sample_id}, [("timestamp", ASCENDING)]),
+    ("POST /message/{message_id}/like", "votes", {"message_id": _sample_id, "user_id": _sample_id}, None),
+    ("GET /messages/votes", "votes", {"user_id": _sample_id, "message_id": {"$in": [_sample_id]}}, None),
+    ("GET /messages/votes", "messages", {"_id": {"$in": [_sample_id]}}, None),
+    ("POST /validate-otp", "otps", {"email": _sample_email}, None),
+    ("POST /forgot-password/validate-otp", "otps", {"email": _sample_email, "purpose": "forgot-password"}, None),
+    ("POST /register", "otps", {"email": _sample_email, "validated": True}, None),
+    ("Models lookup", "Models", {"sourcelanguage": "Hindi", "model_type": "asr"}, None),
+    ("Models lookup", "Models", {"sourcelanguage": "Hindi", "targetlanguage": "English"}, None),
+    ("Email outbox lease", "email_outbox", {"status": "queued", "available_at": {"$lte": _sample_id.generation_time}}, [("available_at", ASCENDING)]),
+    ("Email outbox lease", "email_outbox", {"status": "leased", "lease_expires_at": {"$lte": _sample_id.generation_time}}, None),
+    ("TTS worker lease", "tts_jobs", {"status": "queued", "available_at": {"$lte": _sample_id.generation_time}}, [("priority", ASCENDING)]),
+    ("TTS worker lease", "tts_jobs", {"status": "leased", "lease_expires_at": {"$lte": _sample_id.generation_time}}, None),
+    ("GET /stats/tts-queue", "tts_jobs", {"status": "queued"}, None),
+]
+
+
+async def create_collection_indexes(db, collection_name: str, models: List[IndexModel]):
+    collection = db[collection_name]
+    for model in models:
+        try:
+            await collection.create_indexes([model])
+        except OperationFailure as e:
+            expire_after = model.document.get("expireAfterSeconds")
+            if e.code == INDEX_OPTIONS_CONFLICT and expire_after is not None:
+                # Same keys with a different TTL: update the TTL in place
+                await db.command({
+                    "collMod": collection_name,
+                    "index": {"keyPattern": model.document["key"], "expireAfterSeconds": expire_after}
+                })
+            else:
+                # Don't block startup (e.g. duplicate emails prevent the unique index); report it
+                print(f"Failed to create index {dict(model.document['key'])} on {collection_name}: {str(e)}")
+
+
+async def ensure_indexes():
+    db = MongoDB.get_db()
+    for collection_name, models in INDEXES.items():
+        await create_collection_indexes(db, collection_name, models)
+
+
+def find_stages(plan, stage: str) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(find_stages(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(find_stages(item, stage) for item in plan)
+    return False
+
+
+async def check_query_shapes() -> List[str]:
+    """Returns a description of every query shape whose winning plan is a COLLSCAN."""
+    db = MongoDB.get_db()
+    failures = []
+    for route, collection_name, query, sort in QUERY_SHAPES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        status = "COLLSCAN" if find_stages(winning_plan, "COLLSCAN") else "ok"
+        print(f"{status:8} {collection_name:15} {route}: {query}")
+        if status == "COLLSCAN":
+            failures.append(f"{route} on {collection_name}")
+    return failures
+
+
+async def run(check: bool) -> int:
+    await ensure_indexes()
+    if not check:
+        return 0
+
+    failures = await check_query_shapes()
+    if failures:
+        print(f"{len(failures)} query shape(s) fall back to a collection scan")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the declared indexes and optionally verify index usage.")
+    parser.add_argument("--check", action="store_true", help="Fail if any route's query shape is a COLLSCAN")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.check)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+import asyncio
+import os
+import smtplib
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Deque, Dict, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, ReturnDocument
+
+load_dotenv()
+
+from db import MongoDB
+
+MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
+MAIL_USERNAME = os.getenv("MAIL_USERNAME")
+MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
+MAIL_FROM = os.getenv("MAIL_FROM") or MAIL_USERNAME
+# "ssl" (implicit TLS), "starttls" or "none" (e.g. a local debugging SMTP server).
+# Defaults to ssl on port 465, which the old inline sender used with SMTP_SSL, else starttls.
+MAIL_SECURITY = os.getenv("MAIL_SECURITY", "ssl" if MAIL_PORT == 465 else "starttls").lower()
+if MAIL_SECURITY not in ("ssl", "starttls", "none"):
+    raise ValueError(f"Unknown MAIL_SECURITY: {MAIL_SECURITY}")
+if (MAIL_SECURITY == "ssl") != (MAIL_PORT == 465) and MAIL_PORT in (465, 587):
+    raise ValueError(f"MAIL_SECURITY={MAIL_SECURITY} does not match MAIL_PORT={MAIL_PORT}")
+# "smtp" or "debug" (prints mail instead of sending it)
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "smtp").lower()
+# The SMTP connection is closed after this long without mail
+MAIL_CONNECTION_IDLE_SECONDS = float(os.getenv("MAIL_CONNECTION_IDLE_SECONDS", "60"))
+
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_BACKOFF_SECONDS = float(os.getenv("MAIL_BACKOFF_SECONDS", "10"))
+MAIL_VISIBILITY_TIMEOUT = float(os.getenv("MAIL_VISIBILITY_TIMEOUT", "120"))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "1"))
+# Per recipient domain, per process; 0 disables throttling
+MAIL_DOMAIN_RATE_PER_MINUTE = int(os.getenv("MAIL_DOMAIN_RATE_PER_MINUTE", "60"))
+# Sent and failed mail is kept this long for debugging, with its body cleared; see indexes.py
+MAIL_OUTBOX_RETENTION_SECONDS = int(os.getenv("MAIL_OUTBOX_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+
+def build_message(to_email: str, subject: str, body: str) -> MIMEMultipart:
+    message = MIMEMultipart()
+    message["From"] = MAIL_FROM
+    message["To"] = to_email
+    message["Subject"] = subject
+    message.attach(MIMEText(body, "plain"))
+    return message
+
+
+class SMTPTransport:
+    """
+    Sends mail over one persistent SMTP connection, reconnecting when the
+    server drops it and closing it after `idle_timeout` without mail.
+    smtplib is blocking, so all SMTP calls run on a single dedicated thread.
+    """
+
+    def __init__(
+        self,
+        host: str = MAIL_SERVER,
+        port: int = MAIL_PORT,
+        username: Optional[str] = MAIL_USERNAME,
+        password: Optional[str] = MAIL_PASSWORD,
+        security: str = MAIL_SECURITY,
+        idle_timeout: float = MAIL_CONNECTION_IDLE_SECONDS
+    ):
+        self.host = host
+        self.port = port
+        self._username = username
+        self._password = password
+        self.security = security
+        self.idle_timeout = idle_timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.connections_opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=30)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=30)
+            if self.security == "starttls":
+                server.starttls()
+        if self._username:
+            server.login(self._username, self._password)
+        self.connections_opened += 1
+        return server
+
+    def _disconnect(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self._disconnect()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _send_one(self, message: MIMEMultipart):
+        try:
+            self._connection().sendmail(message["From"], [message["To"]], message.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # Dropped while idle: retry once on a fresh connection
+            self._server = None
+            self._connection().sendmail(message["From"], [message["To"]], message.as_string())
+        finally:
+            self._last_used = time.monotonic()
+
+    def _send_batch(self, messages: List[MIMEMultipart]) -> List[Optional[Exception]]:
+        results = []
+        for message in messages:
+            try:
+                self._send_one(message)
+                results.append(None)
+            except smtplib.SMTPRecipientsRefused as e:
+                results.append(e)
+            except Exception as e:
+                # Connection-level failure: the connection may be unusable
+                self._disconnect()
+                results.append(e)
+        return results
+
+    async def send(self, messages: List[MIMEMultipart]) -> List[Optional[Exception]]:
+        """Returns one entry per message: None if sent, else the error."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._send_batch, messages)
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._disconnect)
+
+    def get_stats(self) -> dict:
+        return {
+            "transport": "smtp",
+            "host": self.host,
+            "connected": self._server is not None,
+            "connections_opened": self.connections_opened,
+        }
+
+
+class DebugTransport:
+    """Prints mail instead of sending it and keeps the most recent messages in `sent`."""
+
+    def __init__(self, keep: int = 100):
+        self.sent: Deque[MIMEMultipart] = deque(maxlen=keep)
+
+    async def send(self, messages: List[MIMEMultipart]) -> List[Optional[Exception]]:
+        for message in messages:
+            print(f"[mail] To: {message['To']} Subject: {message['Subject']}\n{message.get_payload()[0].get_payload()}")
+            self.sent.append(message)
+        return [None] * len(messages)
+
+    async def close(self):
+        pass
+
+    def get_stats(self) -> dict:
+        return {"transport": "debug", "sent": len(self.sent)}
+
+
+def build_transport(name: str = MAIL_TRANSPORT):
+    if name == "debug":
+        return DebugTransport()
+    if name == "smtp":
+        return SMTPTransport()
+    raise ValueError(f"Unknown MAIL_TRANSPORT: {name}")
+
+
+class DomainThrottle:
+    """Sliding one-minute window of sends per recipient domain."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._sent: Dict[str, Deque[float]] = {}
+
+    def _window(self, domain: str) -> Deque[float]:
+        window = self._sent.setdefault(domain, deque())
+        cutoff = time.monotonic() - 60
+        while window and window[0] <= cutoff:
+            window.popleft()
+        return window
+
+    def throttled_domains(self) -> List[str]:
+        if self.per_minute <= 0:
+            return []
+        throttled = [domain for domain in list(self._sent) if len(self._window(domain)) >= self.per_minute]
+        for domain in [domain for domain, window in self._sent.items() if not window]:
+            del self._sent[domain]
+        return throttled
+
+    def acquire(self, domain: str) -> bool:
+        """Takes one send from the domain's budget, or returns False if it is used up."""
+        if self.per_minute <= 0:
+            return True
+        window = self._window(domain)
+        if len(window) >= self.per_minute:
+            return False
+        window.append(time.monotonic())
+        return True
+
+    def retry_after(self, domain: str) -> float:
+        window = self._window(domain)
+        return max(0.0, window[0] + 60 - time.monotonic()) if window else 0.0
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    # 5xx for every recipient: retrying the same address will not help
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return False
+
+
+class EmailOutbox:
+    """
+    Mongo-backed outbox. `enqueue` only inserts the mail, so request handlers
+    return immediately; a single background worker leases queued mail in
+    batches and sends each batch over the transport's persistent connection.
+    Failures are retried with exponential backoff up to `max_attempts`;
+    addresses the server rejects outright fail at once. Recipient domains
+    that reached their per-minute limit are skipped when leasing, and each
+    message takes its domain's budget as it is sent, so mail over the limit
+    within a batch is put back without using up an attempt.
+    """
+
+    def __init__(
+        self,
+        collection,
+        transport,
+        batch_size: int = MAIL_BATCH_SIZE,
+        max_attempts: int = MAIL_MAX_ATTEMPTS,
+        backoff_seconds: float = MAIL_BACKOFF_SECONDS,
+        visibility_timeout: float = MAIL_VISIBILITY_TIMEOUT,
+        poll_interval: float = MAIL_POLL_INTERVAL,
+        domain_rate_per_minute: int = MAIL_DOMAIN_RATE_PER_MINUTE
+    ):
+        self._collection = collection
+        self.transport = transport
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self._throttle = DomainThrottle(domain_rate_per_minute)
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self.sent = 0
+        self.retried = 0
+        self.deferred = 0
+        self.failed = 0
+
+    async def enqueue(self, to_email: str, subject: str, body: str):
+        now = datetime.utcnow()
+        await self._collection.insert_one({
+            "to": to_email,
+            "domain": to_email.rsplit("@", 1)[-1].lower(),
+            "subject": subject,
+            "body": body,
+            "status": "queued",
+            "attempts": 0,
+            "available_at": now,
+            "lease_expires_at": None,
+            "lease_token": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self, drain_timeout: float = 10):
+        """Finishes the batch in progress, then closes the transport."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._worker is not None:
+            done, pending = await asyncio.wait({self._worker}, timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            self._worker = None
+        await self.transport.close()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                batch = await self._lease_batch()
+                if batch:
+                    await self._send_batch(batch)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Email outbox worker error: {str(e)}")
+            await self._wait_for_work()
+
+    async def _wait_for_work(self):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _lease_batch(self) -> List[dict]:
+        now = datetime.utcnow()
+        query = {
+            "$or": [
+                {"status": "queued", "available_at": {"$lte": now}},
+                {"status": "leased", "lease_expires_at": {"$lte": now}},
+            ]
+        }
+        throttled = self._throttle.throttled_domains()
+        if throttled:
+            query["domain"] = {"$nin": throttled}
+
+        lease_token = uuid.uuid4().hex
+        batch = []
+        while len(batch) < self.batch_size:
+            job = await self._collection.find_one_and_update(
+                query,
+                {
+                    "$set": {
+                        "status": "leased",
+                        "lease_token": lease_token,
+                        "lease_expires_at": now + timedelta(seconds=self.visibility_timeout),
+                        "updated_at": now
+                    },
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("available_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                break
+            batch.append(job)
+        return batch
+
+    async def _send_batch(self, batch: List[dict]):
+        allowed = []
+        for job in batch:
+            if self._throttle.acquire(job["domain"]):
+                allowed.append(job)
+            else:
+                await self._defer(job, self._throttle.retry_after(job["domain"]))
+        if not allowed:
+            return
+
+        results = await self.transport.send([build_message(job["to"], job["subject"], job["body"]) for job in allowed])
+        for job, error in zip(allowed, results):
+            if error is None:
+                await self._settle(job, {"status": "sent", "last_error": None})
+                self.sent += 1
+            else:
+                await self._handle_failure(job, error)
+
+    async def _handle_failure(self, job: dict, error: Exception):
+        print(f"Error sending email {job['_id']} to {job['to']} (attempt {job['attempts']}): {str(error)}")
+        if job["attempts"] < self.max_attempts and not is_permanent_failure(error):
+            delay = self.backoff_seconds * (2 ** (job["attempts"] - 1))
+            await self._finish(job, {
+                "status": "queued",
+                "available_at": datetime.utcnow() + timedelta(seconds=delay),
+                "last_error": str(error)
+            })
+            self.retried += 1
+            return
+
+        await self._settle(job, {"status": "failed", "last_error": str(error)})
+        self.failed += 1
+
+    async def _defer(self, job: dict, delay: float):
+        # Not attempted, so the attempt taken by the lease is given back
+        await self._finish(job, {
+            "status": "queued",
+            "available_at": datetime.utcnow() + timedelta(seconds=delay)
+        }, inc={"attempts": -1})
+        self.deferred += 1
+
+    async def _settle(self, job: dict, fields: dict):
+        # Bodies carry OTP codes, so they are dropped once the mail will not be sent again
+        fields.update({"body": None, "settled_at": datetime.utcnow()})
+        await self._finish(job, fields)
+
+    async def _finish(self, job: dict, fields: dict, inc: Optional[dict] = None):
+        # Only the current lease holder may settle the mail
+        fields.update({"lease_token": None, "lease_expires_at": None, "updated_at": datetime.utcnow()})
+        update = {"$set": fields}
+        if inc:
+            update["$inc"] = inc
+        await self._collection.update_one(
+            {"_id": job["_id"], "status": "leased", "lease_token": job["lease_token"]},
+            update
+        )
+
+    async def get_stats(self) -> dict:
+        counts = {}
+        async for row in self._collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return {
+            "running": self._worker is not None,
+            "sent": self.sent,
+            "retried": self.retried,
+            "deferred": self.deferred,
+            "failed": self.failed,
+            "throttled_domains": self._throttle.throttled_domains(),
+            "transport": self.transport.get_stats(),
+            "mail_by_status": counts,
+        }
+
+
+mail_outbox = EmailOutbox(MongoDB.get_db()["email_outbox"], build_transport())
@@ -15,8 +15,8 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from pymongo import DESCENDING, MongoClient, ASCENDING
-from auth.hashing import hash_password, verify_password
-from auth.jwt_handler import create_access_token, decode_access_token, create_access_token2
+from auth.hashing import hash_password, verify_password, password_hasher
+from auth.jwt_handler import create_access_token, decode_access_token, create_access_token2, verified_tokens
 from auth.models import UserSchema, UserLoginSchema
 import pytz
 from fastapi.exceptions import RequestValidationError
@@ -28,6 +28,22 @@ import time
 import sys
 import pymongo
 from db import MongoDB
+from http_client import HTTPClient
+from chat.translation_cache import translation_cache
+from chat.tts_cache import tts_cache
+from chat.answer_cache import answer_cache
+from chat.ask import tts_queue, tts_change_relay
+from chat.tts_events import tts_events_router
+from chat.notifications import NOTIFICATIONS_CHANGE_STREAM, pubsub
+from indexes import ensure_indexes
+from auth.dependencies import require_admin
+from mailer import mail_outbox
+from rate_limit import rate_limiter
+from metrics import performance_log, render_metrics, stage_latency
+import resilience
+from chat.audio_upload import UploadSizeLimitMiddleware
+from chat.audio_preprocess import audio_preprocessor
+from fastapi.responses import PlainTextResponse
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from auth.login import login_router as login_router
@@ -60,7 +76,10 @@ load_dotenv()
 # Initialize FastAPI app
 app = FastAPI(swagger_ui_parameters={"syntaxHighlight.theme": "obsidian"})
 
-# Enable CORS
+# Refuses oversized audio uploads from Content-Length before the body is spooled
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Enable CORS (added last so it wraps the 413 responses too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Adjust as needed
@@ -75,14 +94,12 @@ app.include_router(ask_router)
 app.include_router(otp_router)
 app.include_router(vote_router)
 app.include_router(message_router)
+app.include_router(tts_events_router)
 
 db = MongoDB.get_db()
 users_collection = db["users"]
 conversation_collection = db["conversations"]
 
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-
 # Helper functions
 def is_valid_object_id(id_str: str) -> bool:
     try:
@@ -91,35 +108,9 @@ def is_valid_object_id(id_str: str) -> bool:
     except Exception:
         return False
 
-def serialize_mongo_document(document):
-
-    if isinstance(document, list):
-        return [serialize_mongo_document(doc) for doc in document]
-    
-    if isinstance(document, dict):
-        for key, value in document.items():
-            if isinstance(value, ObjectId):
-                document[key] = str(value)
-            elif isinstance(value, dict) or isinstance(value, list):
-                document[key] = serialize_mongo_document(value)
-    return document
-
-def send_email(to_email: str, subject: str, body: str):
-    smtp_server = os.getenv("MAIL_SERVER")
-    smtp_port = os.getenv("MAIL_PORT")
-    smtp_username = os.getenv("MAIL_USERNAME")
-    smtp_password = os.getenv("MAIL_PASSWORD")
-    
-    msg = MIMEMultipart()
-    msg["From"] = smtp_username
-    msg["To"] = to_email
-    msg["Subject"] = subject
-
-    msg.attach(MIMEText(body, "plain"))
-
-    with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-        server.login(smtp_username, smtp_password)
-        server.sendmail(smtp_username, to_email, msg.as_string())
+async def send_email(to_email: str, subject: str, body: str):
+    # Sent by the outbox worker; configure the server with MAIL_SERVER/MAIL_PORT/MAIL_SECURITY
+    await mail_outbox.enqueue(to_email, subject, body)
 
 # Function to generate model-specific token
 def generate_model_token(user_id: str, model_id: str, requests_per_minute: int, access_start_date: datetime, access_end_date: datetime, hashed_password: str = None):
@@ -140,6 +131,62 @@ def generate_model_token(user_id: str, model_id: str, requests_per_minute: int,
     return token
 
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    await ensure_indexes()
+
+
+@app.on_event("startup")
+async def start_tts_workers():
+    # With TTS_WORKER_CONCURRENCY=0 jobs are left to `python -m chat.tts_queue` processes
+    await tts_queue.start()
+    if NOTIFICATIONS_CHANGE_STREAM:
+        await tts_change_relay.start()
+
+
+@app.on_event("shutdown")
+async def stop_tts_workers():
+    # Drain in-flight TTS jobs before the HTTP session they use is closed
+    await tts_queue.stop()
+    await tts_change_relay.stop()
+    await HTTPClient.close()
+
+
+@app.on_event("startup")
+async def start_performance_log():
+    performance_log.start()
+
+
+@app.on_event("shutdown")
+async def stop_performance_log():
+    performance_log.stop()
+
+
+@app.on_event("startup")
+async def start_mail_outbox():
+    await mail_outbox.start()
+
+
+@app.on_event("shutdown")
+async def stop_mail_outbox():
+    await mail_outbox.stop()
+
+
+@app.on_event("shutdown")
+async def stop_password_hasher():
+    password_hasher.close()
+
+
+@app.on_event("startup")
+async def start_audio_preprocessor():
+    await audio_preprocessor.start()
+
+
+@app.on_event("shutdown")
+async def stop_audio_preprocessor():
+    audio_preprocessor.close()
+
+
 # Routes
 
 @app.get("/")
@@ -147,6 +194,97 @@ async def check_working():
     return {"Transport Bot functioning properly"}
 
 
+@app.get("/stats/http-pool", dependencies=[Depends(require_admin)])
+async def get_http_pool_stats():
+    return {
+        "status": "success",
+        "data": HTTPClient.get_stats()
+    }
+
+
+@app.get("/stats/caches", dependencies=[Depends(require_admin)])
+async def get_cache_stats():
+    return {
+        "status": "success",
+        "data": {
+            "translation": translation_cache.get_stats(),
+            "tts": tts_cache.get_stats(),
+            "answers": answer_cache.get_stats(),
+            "tokens": verified_tokens.get_stats()
+        }
+    }
+
+
+@app.get("/stats/tts-queue", dependencies=[Depends(require_admin)])
+async def get_tts_queue_stats():
+    return {
+        "status": "success",
+        "data": await tts_queue.get_stats()
+    }
+
+
+@app.get("/stats/password-hashing", dependencies=[Depends(require_admin)])
+async def get_password_hashing_stats():
+    return {
+        "status": "success",
+        "data": password_hasher.get_stats()
+    }
+
+
+@app.get("/stats/audio-preprocessing", dependencies=[Depends(require_admin)])
+async def get_audio_preprocessing_stats():
+    return {
+        "status": "success",
+        "data": audio_preprocessor.get_stats()
+    }
+
+
+@app.get("/stats/mail-outbox", dependencies=[Depends(require_admin)])
+async def get_mail_outbox_stats():
+    return {
+        "status": "success",
+        "data": await mail_outbox.get_stats()
+    }
+
+
+@app.get("/stats/rate-limits", dependencies=[Depends(require_admin)])
+async def get_rate_limit_stats():
+    return {
+        "status": "success",
+        "data": rate_limiter.get_stats()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics() + resilience.render_upstream_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/upstreams", dependencies=[Depends(require_admin)])
+async def get_upstream_stats():
+    return {
+        "status": "success",
+        "data": resilience.get_stats()
+    }
+
+
+@app.get("/stats/latency", dependencies=[Depends(require_admin)])
+async def get_latency_stats():
+    return {
+        "status": "success",
+        "data": stage_latency.summary()
+    }
+
+
+@app.get("/stats/notifications", dependencies=[Depends(require_admin)])
+async def get_notification_stats():
+    return {
+        "status": "success",
+        "data": pubsub.get_stats()
+    }
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     # Extract the error details from the exception
@@ -0,0 +1,228 @@
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Seconds; upstream calls (ASR, chatbot, TTS) take up to tens of seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+# Bounds label cardinality (e.g. arbitrary language form values)
+METRICS_MAX_LABEL_SETS = int(os.getenv("METRICS_MAX_LABEL_SETS", "500"))
+
+PERFORMANCE_LOG_ENABLED = os.getenv("PERFORMANCE_LOG_ENABLED", "true").lower() == "true"
+PERFORMANCE_LOG_FILE = os.getenv("PERFORMANCE_LOG_FILE", "performance_logs.txt")
+PERFORMANCE_LOG_MAX_BYTES = int(os.getenv("PERFORMANCE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+PERFORMANCE_LOG_BACKUPS = int(os.getenv("PERFORMANCE_LOG_BACKUPS", "5"))
+
+# Request checkpoint -> pipeline stage that ends there. Time between
+# checkpoints not listed here is attributed to the next listed one.
+CHECKPOINT_STAGES = {
+    "authentication_complete": "auth",
+    "upload_validated": "upload_validation",
+    "conversation_created": "conversation",
+    "existing_conversation_retrieved": "conversation",
+    "audio_normalized": "audio_preprocess",
+    "asr_completed": "asr",
+    "translation_to_english_completed": "nmt_in",
+    "chatbot_response_received": "chatbot",
+    "response_formatting_completed": "formatting",
+    "translation_to_original_completed": "nmt_out",
+    "database_store_completed": "db_store",
+    "response_prepared": "tts_schedule",
+}
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts (non-cumulative, last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self._series.get(labels)
+        if series is None:
+            if len(self._series) >= METRICS_MAX_LABEL_SETS:
+                labels = tuple("other" for _ in self.label_names)
+                series = self._series.get(labels)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[labels] = series
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, labels: Tuple[str, ...]) -> int:
+        series = self._series.get(labels)
+        return series[2] if series is not None else 0
+
+    def quantile(self, labels: Tuple[str, ...], q: float) -> Optional[float]:
+        """Estimates the q-quantile by linear interpolation within its bucket, like histogram_quantile()."""
+        series = self._series.get(labels)
+        if series is None or series[2] == 0:
+            return None
+        rank = q * series[2]
+        cumulative = 0
+        for index, count in enumerate(series[0]):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def summary(self) -> List[dict]:
+        rows = []
+        for labels, (_, total, count) in sorted(self._series.items()):
+            row = dict(zip(self.label_names, labels))
+            row.update({
+                "count": count,
+                "mean": round(total / count, 4) if count else None,
+                "p50": self._rounded(self.quantile(labels, 0.5)),
+                "p95": self._rounded(self.quantile(labels, 0.95)),
+                "p99": self._rounded(self.quantile(labels, 0.99)),
+            })
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def _rounded(value: Optional[float]) -> Optional[float]:
+        return round(value, 4) if value is not None else None
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class PerformanceLogWriter:
+    """
+    Appends request timing blocks to a size-rotated log file on a background
+    thread (QueueHandler/QueueListener), so requests never wait on file I/O.
+    Blocks keep the `=== Request at ... ===` format of performance_logs.txt.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._logger = logging.getLogger("performance_log")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._listener: Optional[logging.handlers.QueueListener] = None
+
+    def start(self):
+        if self._listener is not None:
+            return
+        file_handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8"
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(logging.handlers.QueueHandler(self._queue))
+        self._listener = logging.handlers.QueueListener(self._queue, file_handler)
+        self._listener.start()
+
+    def stop(self):
+        if self._listener is None:
+            return
+        # Flushes the queued blocks
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+        self._logger.handlers.clear()
+
+    def write(self, block: str):
+        if self._listener is not None:
+            self._logger.info(block)
+
+
+stage_latency = Histogram(
+    "chat_stage_duration_seconds",
+    "Duration of each /ask pipeline stage.",
+    ("stage", "language")
+)
+performance_log = PerformanceLogWriter(PERFORMANCE_LOG_FILE, PERFORMANCE_LOG_MAX_BYTES, PERFORMANCE_LOG_BACKUPS)
+
+
+def observe_stage(stage: str, language: str, seconds: float):
+    stage_latency.observe((stage, language.lower()), seconds)
+
+
+class RequestTimer:
+    """
+    Cumulative per-request checkpoints. `finish` records the time between
+    checkpoints as pipeline stages in the stage_latency histogram and, if
+    enabled, queues the request's block for the performance log.
+    """
+
+    def __init__(self, language: str = "unknown"):
+        self.language = language
+        self.start_time = time.time()
+        self.steps = {}
+
+    def log_timestamp(self, step_name):
+        self.steps[step_name] = {
+            "timestamp": time.time(),
+            "elapsed": time.time() - self.start_time
+        }
+
+    def stage_durations(self) -> List[Tuple[str, float]]:
+        durations = []
+        stage_start = self.start_time
+        for step, data in sorted(self.steps.items(), key=lambda item: item[1]["timestamp"]):
+            stage = CHECKPOINT_STAGES.get(step)
+            if stage is None:
+                continue
+            durations.append((stage, data["timestamp"] - stage_start))
+            stage_start = data["timestamp"]
+        return durations
+
+    def finish(self, total_label: str = "Pre-TTS total time"):
+        total = time.time() - self.start_time
+        for stage, seconds in self.stage_durations():
+            observe_stage(stage, self.language, seconds)
+        observe_stage("total", self.language, total)
+
+        if PERFORMANCE_LOG_ENABLED:
+            lines = [f"\n\n=== Request at {datetime.now().isoformat()} ==="]
+            lines.extend(f"{step}: {data['elapsed']:.3f}s" for step, data in self.steps.items())
+            lines.append(f"{total_label}: {total:.3f}s")
+            performance_log.write("\n".join(lines))
+
+
+async def start_request_timer() -> RequestTimer:
+    """
+    Route dependency that starts the request's timer. List it before the
+    route's auth and rate-limit dependencies so the "auth" stage covers them;
+    the handler sets the language once the form is parsed.
+    """
+    timer = RequestTimer()
+    timer.log_timestamp("request_received")
+    return timer
+
+
+def render_metrics() -> str:
+    return "\n".join(stage_latency.render()) + "\n"
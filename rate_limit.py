@@ -0,0 +1,181 @@
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request, status
+from pymongo import ReturnDocument
+
+load_dotenv()
+
+from auth.dependencies import Principal, get_principal
+from cache import LRUCache
+from db import MongoDB
+
+# "memory" (per process) or "mongo" (shared by every worker process)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_MEMORY_MAX_KEYS = int(os.getenv("RATE_LIMIT_MEMORY_MAX_KEYS", "100000"))
+# Use the first X-Forwarded-For address as the client IP (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+# Logged-in users, unless their token carries its own requests_per_minute
+RATE_LIMIT_ASK_PER_MINUTE = int(os.getenv("RATE_LIMIT_ASK_PER_MINUTE", "20"))
+# Guests, per IP
+RATE_LIMIT_GUEST_ASK_PER_MINUTE = int(os.getenv("RATE_LIMIT_GUEST_ASK_PER_MINUTE", "10"))
+RATE_LIMIT_VOTE_PER_MINUTE = int(os.getenv("RATE_LIMIT_VOTE_PER_MINUTE", "30"))
+RATE_LIMIT_OTP_PER_HOUR_PER_EMAIL = int(os.getenv("RATE_LIMIT_OTP_PER_HOUR_PER_EMAIL", "5"))
+RATE_LIMIT_OTP_PER_HOUR_PER_IP = int(os.getenv("RATE_LIMIT_OTP_PER_HOUR_PER_IP", "20"))
+
+
+def sliding_window_retry_after(previous: int, current: int, elapsed: float, limit: int, window_seconds: float) -> Optional[float]:
+    """
+    Sliding-window counter: the previous fixed window's count is weighted by
+    how much of it still overlaps the sliding window. Returns None if one
+    more request fits, else the seconds until it will.
+    """
+    weight = 1 - elapsed / window_seconds
+    if previous * weight + current + 1 <= limit:
+        return None
+    if current + 1 > limit or previous == 0:
+        # Not before the current window rolls over
+        return window_seconds - elapsed
+    # Wait until enough of the previous window has slid out
+    needed_weight = (limit - current - 1) / previous
+    return max(0.0, (1 - needed_weight) * window_seconds - elapsed)
+
+
+class MemoryBackend:
+    """Per-process counters: [window_index, previous, current] per key."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MEMORY_MAX_KEYS):
+        self._counters = LRUCache(max_entries=max_keys)
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> Optional[float]:
+        now = time.time()
+        window_index = int(now // window_seconds)
+        elapsed = now - window_index * window_seconds
+
+        counter = self._counters.get(key)
+        if counter is None or counter[0] < window_index - 1:
+            counter = [window_index, 0, 0]
+        elif counter[0] == window_index - 1:
+            counter = [window_index, counter[2], 0]
+
+        retry_after = sliding_window_retry_after(counter[1], counter[2], elapsed, limit, window_seconds)
+        if retry_after is None:
+            counter[2] += 1
+        # Counters are useless once two windows old
+        self._counters.set(key, counter, ttl_seconds=2 * window_seconds)
+        return retry_after
+
+
+class MongoBackend:
+    """
+    Counters shared through Mongo, one document per key and fixed window,
+    removed by a TTL index on expires_at. A request over the limit takes
+    its increment back, so rejected requests do not count.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> Optional[float]:
+        now = time.time()
+        window_index = int(now // window_seconds)
+        elapsed = now - window_index * window_seconds
+        expires_at = datetime.utcnow() + timedelta(seconds=2 * window_seconds)
+
+        current_doc = await self._collection.find_one_and_update(
+            {"_id": f"{key}:{window_index}"},
+            {"$inc": {"count": 1}, "$setOnInsert": {"expires_at": expires_at}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        previous_doc = await self._collection.find_one({"_id": f"{key}:{window_index - 1}"})
+        previous = previous_doc["count"] if previous_doc else 0
+
+        retry_after = sliding_window_retry_after(previous, current_doc["count"] - 1, elapsed, limit, window_seconds)
+        if retry_after is not None:
+            await self._collection.update_one({"_id": current_doc["_id"]}, {"$inc": {"count": -1}})
+        return retry_after
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+        self.allowed = 0
+        self.rejected = 0
+
+    async def enforce(self, scope: str, identity: str, limit: int, window_seconds: float = 60):
+        """Counts a request for (scope, identity); raises 429 with Retry-After once over `limit`."""
+        if limit <= 0:
+            return
+        retry_after = await self.backend.hit(f"{scope}:{identity}", limit, window_seconds)
+        if retry_after is None:
+            self.allowed += 1
+            return
+
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests. Please try again later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def user_limit(principal: Principal) -> Tuple[str, int]:
+    """(identity, requests per minute) for a logged-in user; model tokens carry their own limit."""
+    claims = principal.claims
+    identity = principal.user_id
+    if claims.get("model_id"):
+        identity = f"{identity}:{claims['model_id']}"
+    return identity, int(claims.get("requests_per_minute") or RATE_LIMIT_ASK_PER_MINUTE)
+
+
+async def limit_ask(request: Request, principal: Principal = Depends(get_principal)):
+    if principal.is_guest:
+        await rate_limiter.enforce("ask-ip", client_ip(request), RATE_LIMIT_GUEST_ASK_PER_MINUTE)
+        return
+    identity, per_minute = user_limit(principal)
+    await rate_limiter.enforce("ask-user", identity, per_minute)
+
+
+async def limit_votes(request: Request, principal: Principal = Depends(get_principal)):
+    identity = client_ip(request) if principal.is_guest else principal.user_id
+    await rate_limiter.enforce("vote", identity, RATE_LIMIT_VOTE_PER_MINUTE)
+
+
+async def limit_otp(request: Request):
+    await rate_limiter.enforce("otp-ip", client_ip(request), RATE_LIMIT_OTP_PER_HOUR_PER_IP, window_seconds=3600)
+
+
+async def limit_otp_email(email: str):
+    await rate_limiter.enforce("otp-email", email.strip().lower(), RATE_LIMIT_OTP_PER_HOUR_PER_EMAIL, window_seconds=3600)
+
+
+def build_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "mongo":
+        return MongoBackend(MongoDB.get_db()["rate_limits"])
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {name}")
+
+
+rate_limiter = RateLimiter(build_backend())
@@ -0,0 +1,329 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, TypeVar
+
+import aiohttp
+from fastapi import HTTPException
+
+from metrics import Histogram, escape_label
+
+# Budget for all upstream calls of one /ask request, from when it is received
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+# Per-call caps; a call gets the smaller of its cap and the request's remaining budget
+ASR_TIMEOUT_SECONDS = float(os.getenv("ASR_TIMEOUT_SECONDS", "30"))
+NMT_TIMEOUT_SECONDS = float(os.getenv("NMT_TIMEOUT_SECONDS", "15"))
+CHATBOT_TIMEOUT_SECONDS = float(os.getenv("CHATBOT_TIMEOUT_SECONDS", "45"))
+TTS_TIMEOUT_SECONDS = float(os.getenv("TTS_TIMEOUT_SECONDS", "60"))
+
+# Consecutive failures that open an endpoint's circuit, and how long it stays open before a probe
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# A hedged call starts on the next replica once the first has run this long.
+# With enough samples the endpoint's own p95 latency is used instead.
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "2"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+
+T = TypeVar("T")
+
+
+
+class Upstream(NamedTuple):
+    """
+    One replica of an upstream API. `name` labels its breaker, metrics and
+    error messages, so internal server addresses are never published.
+    """
+    name: str
+    url: str
+
+
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+upstream_latency = Histogram(
+    "upstream_request_duration_seconds",
+    "Duration of upstream model API calls, successful or not.",
+    ("endpoint",)
+)
+
+
+def start_deadline(seconds: float = REQUEST_DEADLINE_SECONDS):
+    """Starts the request's budget; tasks spawned from the request inherit it."""
+    request_deadline.set(time.monotonic() + seconds)
+
+
+def remaining_time() -> Optional[float]:
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def call_budget(timeout: float) -> float:
+    """Seconds the next upstream call may take; raises 504 once the request's budget is spent."""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    return min(timeout, remaining)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one upstream endpoint. Open circuits
+    reject calls immediately; after `reset_seconds` a single probe is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _reset_elapsed(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at >= self.reset_seconds
+
+    def available(self) -> bool:
+        """Whether a call would currently be let through."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return self._reset_elapsed()
+        return not self.probe_in_flight
+
+    def acquire(self) -> bool:
+        if self.state == self.OPEN and self._reset_elapsed():
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        if self.state == self.CLOSED:
+            return True
+        self.rejected += 1
+        return False
+
+    def release(self):
+        # The call was abandoned (e.g. a losing hedge) and says nothing about the endpoint
+        self.probe_in_flight = False
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.state = self.CLOSED
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+hedges = {"started": 0, "won": 0}
+
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    breaker = breakers.get(endpoint)
+    if breaker is None:
+        breaker = CircuitBreaker(endpoint, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        breakers[endpoint] = breaker
+    return breaker
+
+
+@asynccontextmanager
+async def guarded(endpoint: str):
+    """
+    Runs an upstream call under the endpoint's breaker: 503 without calling
+    while the circuit is open, and transport errors and timeouts mapped to
+    502/504. Upstream 5xx responses (raised as HTTPException) count as failures.
+    """
+    breaker = breaker_for(endpoint)
+    if not breaker.acquire():
+        raise HTTPException(status_code=503, detail=f"Upstream temporarily unavailable: {endpoint}")
+
+    started = time.monotonic()
+    try:
+        yield
+    except HTTPException as e:
+        if e.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        raise HTTPException(status_code=504, detail=f"Upstream timed out: {endpoint}")
+    except aiohttp.ClientError as e:
+        breaker.record_failure()
+        # The error text can contain the server address, so it is only logged
+        print(f"Upstream request to {endpoint} failed: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Upstream request failed: {endpoint}")
+    except Exception:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    else:
+        breaker.record_success()
+    finally:
+        upstream_latency.observe((endpoint,), time.monotonic() - started)
+
+
+def hedge_delay(endpoint: str) -> float:
+    if upstream_latency.count((endpoint,)) >= HEDGE_MIN_SAMPLES:
+        return upstream_latency.quantile((endpoint,), 0.95)
+    return HEDGE_DELAY_SECONDS
+
+
+async def _attempt(upstream: Upstream, request: Callable[[str], Awaitable[T]], timeout: float) -> T:
+    budget = call_budget(timeout)
+    async with guarded(upstream.name):
+        return await asyncio.wait_for(request(upstream.url), budget)
+
+
+def is_retriable(error: BaseException) -> bool:
+    return isinstance(error, HTTPException) and error.status_code >= 500
+
+
+async def call_upstream(upstreams: Sequence[Upstream], request: Callable[[str], Awaitable[T]], timeout: float, hedge: bool = False) -> T:
+    """
+    Calls `request(url)` on the first replica whose circuit is not open,
+    failing over to the next replica on a 5xx, timeout or transport error.
+    With `hedge`, the next replica is also started if the current call is
+    still running after the endpoint's hedge delay, and the first success
+    wins. Only hedge idempotent calls.
+    """
+    candidates = []
+    for upstream in upstreams:
+        breaker = breaker_for(upstream.name)
+        if breaker.available():
+            candidates.append(upstream)
+        else:
+            # Skipped replicas count as rejected calls
+            breaker.rejected += 1
+    if not candidates:
+        raise HTTPException(status_code=503, detail=f"Upstream temporarily unavailable: {upstreams[0].name}")
+
+    pending = set()
+    hedged_tasks = set()
+    last_error: Optional[BaseException] = None
+
+    def start_next():
+        task = asyncio.ensure_future(_attempt(candidates.pop(0), request, timeout))
+        pending.add(task)
+        return task
+
+    current = candidates[0]
+    start_next()
+    try:
+        while pending:
+            delay = hedge_delay(current.name) if hedge and candidates else None
+            done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                current = candidates[0]
+                hedged_tasks.add(start_next())
+                hedges["started"] += 1
+                continue
+            for task in done:
+                pending.discard(task)
+                error = task.exception()
+                if error is None:
+                    if task in hedged_tasks:
+                        hedges["won"] += 1
+                    return task.result()
+                if not is_retriable(error):
+                    raise error
+                last_error = error
+            if not pending and candidates:
+                current = candidates[0]
+                start_next()
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def model_upstreams(model: dict) -> List[Upstream]:
+    """
+    The model's api_url followed by its replica_urls, which share its access
+    token, named e.g. "nmt:Hindi-English#0".
+    """
+    languages = "-".join(part for part in (model.get("sourcelanguage"), model.get("targetlanguage")) if part)
+    prefix = f"{model.get('model_type') or 'model'}:{languages}"
+    urls = [model["api_url"], *model.get("replica_urls", [])]
+    return [Upstream(f"{prefix}#{index}", url) for index, url in enumerate(urls)]
+
+
+def get_stats() -> dict:
+    return {
+        "request_deadline_seconds": REQUEST_DEADLINE_SECONDS,
+        "hedges": dict(hedges),
+        "endpoints": {
+            endpoint: dict(breaker.get_stats(), p95=upstream_latency.quantile((endpoint,), 0.95))
+            for endpoint, breaker in breakers.items()
+        },
+    }
+
+
+def render_upstream_metrics() -> str:
+    lines = [
+        "# HELP upstream_circuit_state Circuit breaker state per upstream endpoint (0 closed, 1 half-open, 2 open).",
+        "# TYPE upstream_circuit_state gauge",
+    ]
+    for endpoint, breaker in sorted(breakers.items()):
+        lines.append(f'upstream_circuit_state{{endpoint="{escape_label(endpoint)}"}} {CircuitBreaker.STATE_VALUES[breaker.state]}')
+    lines.extend([
+        "# HELP upstream_calls_total Upstream calls by outcome; rejected calls were refused by an open circuit.",
+        "# TYPE upstream_calls_total counter",
+    ])
+    for endpoint, breaker in sorted(breakers.items()):
+        label = escape_label(endpoint)
+        for outcome, value in (("success", breaker.successes), ("failure", breaker.failures), ("rejected", breaker.rejected)):
+            lines.append(f'upstream_calls_total{{endpoint="{label}",outcome="{outcome}"}} {value}')
+    lines.extend([
+        "# HELP upstream_circuit_opened_total Times each endpoint's circuit opened.",
+        "# TYPE upstream_circuit_opened_total counter",
+    ])
+    for endpoint, breaker in sorted(breakers.items()):
+        lines.append(f'upstream_circuit_opened_total{{endpoint="{escape_label(endpoint)}"}} {breaker.times_opened}')
+    lines.extend([
+        "# HELP upstream_hedged_calls_total Hedged calls started, and those that beat the original.",
+        "# TYPE upstream_hedged_calls_total counter",
+        f'upstream_hedged_calls_total{{result="started"}} {hedges["started"]}',
+        f'upstream_hedged_calls_total{{result="won"}} {hedges["won"]}',
+    ])
+    lines.extend(upstream_latency.render())
+    return "\n".join(lines) + "\n"
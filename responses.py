@@ -0,0 +1,33 @@
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import JSONResponse
+
+
+def encode_bson(obj: Any):
+    """orjson fallback for the BSON types it does not encode natively."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    # datetimes are encoded natively in the same ISO 8601 form jsonable_encoder produces
+    return orjson.dumps(content, default=encode_bson, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    JSON response that encodes Mongo documents as they are: ObjectIds become
+    strings and datetimes ISO 8601 during encoding, in a single pass.
+
+    Return an instance from the route (rather than a dict) so FastAPI does
+    not run jsonable_encoder over the content first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)